@@ -1,9 +1,26 @@
 import numpy as np
-from ciphertext import digitize, is_valid, undigitize
+from functools import lru_cache
+from ciphertext import apply_table, digitize, is_valid, letter_table, undigitize
 from utils import get_common_letters, get_dictionary, get_letter_counts
 
 
-def affine_encrypt(plaintext: list[int], key: tuple[int, int]) -> list[int]:
+@lru_cache(maxsize=312)
+def affine_table(a: int, b: int) -> bytes:
+    """
+    the translate table of an affine map, see ciphertext.letter_table
+
+    Arguments
+    ---------
+    a: the multiplication
+    b: the addition
+
+    Returns
+    -------
+    the table sending p to (a*p + b)%26
+    """
+    return letter_table([(a*p + b)%26 for p in range(26)])
+
+def affine_encrypt(plaintext: list[int]|np.ndarray, key: tuple[int, int]) -> list[int]|np.ndarray:
     """
     performs an affine encryption by c = (key[0]*p + key[1])%26
 
@@ -14,13 +31,13 @@ def affine_encrypt(plaintext: list[int], key: tuple[int, int]) -> list[int]:
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
     if np.gcd(key[0], 26) > 1:
         raise ValueError(f'The key is invalid. gcd({key[0]}, 26) != 1')
-    return [(p*key[0] + key[1])%26 for p in plaintext]
+    return apply_table(plaintext, affine_table(key[0]%26, key[1]%26))
 
-def affine_decrypt(ciphertext: list[int], key: tuple[int, int]) -> list[int]:
+def affine_decrypt(ciphertext: list[int]|np.ndarray, key: tuple[int, int]) -> list[int]|np.ndarray:
     """
     performs an affine decryption by p = key[0]^-1(c - key[1])%26
 
@@ -31,26 +48,32 @@ def affine_decrypt(ciphertext: list[int], key: tuple[int, int]) -> list[int]:
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
     if np.gcd(key[0], 26) > 1:
         raise ValueError(f'The key is invalid. gcd({key[0]}, 26) != 1')
     a_inverse = pow(key[0], -1, 26)
-    return [(a_inverse*(c - key[1]))%26 for c in ciphertext]
+    # p = a^-1*c - a^-1*b is itself an affine map
+    return apply_table(ciphertext, affine_table(a_inverse, (-a_inverse*key[1])%26))
 
-def affine_decrypt_frequency(ciphertext: list[int]) -> tuple[list[int], tuple[int, int]]|None:
+def affine_decrypt_frequency(ciphertext: list[int], dictionary: tuple[frozenset[str], int]|None = None, prefix_len: int = 80, prefix_req_score: float = 0.2) -> tuple[list[int], tuple[int, int]]|None:
     """
     performs decryption by solving the system of two linear equations given by the two most frequent letters
 
     Arguments
     ---------
     ciphertext: the message
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
+    prefix_len: candidates longer than this are first decrypted and checked on this many letters only
+    prefix_req_score: the score per letter the prefix must reach before the whole candidate is decrypted and checked, see ciphertext.is_valid
 
     Returns
     -------
     the decrypted message along with the key or None if no solution is found
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
 
     tciphertext = undigitize(ciphertext, 'cipher')
     letters, _ = get_letter_counts(tciphertext)
@@ -67,7 +90,12 @@ def affine_decrypt_frequency(ciphertext: list[int]) -> tuple[list[int], tuple[in
                 a = ((cipher_1 - cipher_2) * pow(delta_p, -1, 26)) % 26
                 b = (cipher_1 - a * plain_1) % 26
                 if np.gcd(a, 26) == 1:
+                    # reject most wrong keys on a prefix before paying for the whole message
+                    if len(ciphertext) > prefix_len:
+                        prefix = undigitize(affine_decrypt(ciphertext[:prefix_len], (a, b)), 'plain')
+                        if not is_valid(prefix, words, prefix_req_score):
+                            continue
                     plaintext = affine_decrypt(ciphertext, (a, b))
                     tplaintext = undigitize(plaintext, 'plain')
-                    if is_valid(tplaintext, dictionary, max_word_len, 10):
+                    if is_valid(tplaintext, words):
                         return plaintext, (a, b)
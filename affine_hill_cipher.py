@@ -1,57 +1,99 @@
 from mod_algebra import *
 from math import gcd, sqrt
+import numpy as np
+from ciphertext import match_input, to_array
+from fitness import get_ngram_table, rank_candidates
+from hill_cipher import best_column_orders, best_columns, column_decryptions, hill_key_arrays, to_blocks
+from utils import get_normal_letter_probabilities
 
 
-def affine_hill_encrypt(plaintext: list[int], key: tuple[list[list[int]], list[int]]) -> list[int]:
+def affine_hill_encrypt(plaintext: list[int]|np.ndarray, key: tuple[list[list[int]], list[int]]) -> list[int]|np.ndarray:
     """
-    performs an affine hill encryption by y = plaintext@key[0] + key[1]
+    performs an affine hill encryption by y = plaintext@key[0] + key[1], every block at once
 
     Arguments
     ---------
-    plaintext: the message
+    plaintext: the message, padded with 1s (b) to a multiple of the key size
     key: the first is the matrix, the second is the shift b
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
     k_m, k_b = key
-    m = len(k_m)
-    # test if key is valid
-    k_m_det = det(k_m)
-    if k_m_det == 0 or gcd(k_m_det, 26) != 1:
-        raise ValueError('key is non-invertible')
-    # pad
-    plaintext += [1]*(m - len(plaintext)%m)
-    ciphertext = []
-    for i in range(0, len(plaintext), m):
-        c = mult([plaintext[i:i+m]], k_m)[0]
-        c = [num + num_b for num, num_b in zip(c, k_b)]
-        ciphertext += c
-    return ciphertext
-
-def affine_hill_decrypt(ciphertext: list[int], key: tuple[list[list[int]], list[int]]) -> list[int]:
+    k, _ = hill_key_arrays(k_m)
+    ciphertext = (to_blocks(plaintext, len(k), True) @ k + np.asarray(k_b, dtype=np.int64))%26
+    return match_input(ciphertext.ravel(), plaintext)
+
+def affine_hill_decrypt(ciphertext: list[int]|np.ndarray, key: tuple[list[list[int]], list[int]]) -> list[int]|np.ndarray:
     """
-    performs an affine hill decryption by x = (ciphertext - key[1])@key[0]^{-1}
+    performs an affine hill decryption by x = (ciphertext - key[1])@key[0]^{-1}, every block at once
 
     Arguments
     ---------
-    ciphertext: the message
+    ciphertext: the message, a multiple of the key size long
     key: the first is the matrix, the second is the shift b
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
     k_m, k_b = key
-    m = len(k_m)
-    k_m_inv = inv(k_m)
-    plaintext = []
-    for i in range(0, len(ciphertext), m):
-        p = [num - num_b for num, num_b in zip(ciphertext[i:i+m], k_b)]
-        p = mult([p], k_m_inv)
-        plaintext += p[0]
-    return plaintext
+    _, k_inv = hill_key_arrays(k_m)
+    plaintext = ((to_blocks(ciphertext, len(k_inv), False) - np.asarray(k_b, dtype=np.int64)) @ k_inv)%26
+    return match_input(plaintext.ravel(), ciphertext)
+
+def affine_hill_decrypt_ciphertext_only(ciphertext: list[int]|np.ndarray, m: int, top: int = 10, candidates: int = 16, screen: int = 1 << 15, sample_len: int = 1200, table: np.ndarray|None = None, workers: int = 1) -> list[tuple[tuple[list[list[int]], list[int]], float]]:
+    """
+    finds an m x m affine hill key from the ciphertext alone. The difference of consecutive ciphertext blocks is (x_{i+1} - x_i)@key[0], free of the shift, so the columns of key[0]^(-1) are screened on their own against the distribution of differences of english letters. That is a weak signal, so many columns are kept; each gets the letter shift that makes its letters most english and the best by that are put together as in hill_cipher.hill_decrypt_columnwise. The shift is b = s@key[0]
+
+    Arguments
+    ---------
+    ciphertext: the message, a multiple of m long
+    m: the key size, up to about 4
+    top: the number of keys to return
+    candidates: the number of columns kept for putting keys together, candidates!/(candidates - m)! keys are tried
+    screen: the number of columns kept by the difference score for the shift search, shorter messages need more
+    sample_len: the number of letters the columns and keys are scored on
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+    workers: the number of processes to score the columns with, see parallel.parallel_map
+
+    Returns
+    -------
+    the best keys, the matrix and the shift, with their scores, from best to worst
+    """
+    if table is None:
+        table = get_ngram_table()
+    ciphertext = to_array(ciphertext)
+    sample = ciphertext[:min(len(ciphertext), sample_len)//m*m]
+    blocks = to_blocks(sample, m, False)
+    probs = np.array(get_normal_letter_probabilities())
+    log_probs = np.log(probs)
+    # p(d) = sum over a of p(a)p(a + d), the chance two letters m apart differ by d
+    diff_probs = np.array([probs @ np.roll(probs, -d) for d in range(26)])
+    diff_log_probs = np.log(diff_probs/diff_probs.sum()).astype(np.float32)
+
+    # c and -c give the same differences, the shift search picks between them
+    columns = best_columns(np.diff(blocks, axis=0)%26, diff_log_probs, screen, workers)
+    letters = column_decryptions(sample, columns)
+    # the score of shift s is sum over a of count(a)*log p(a - s), one product with a circulant of the log probabilities
+    counts = np.zeros((len(columns), 26))
+    np.add.at(counts, (np.arange(len(columns))[:, None], letters), 1)
+    shift_scores = counts @ log_probs[(np.arange(26)[:, None] - np.arange(26)[None, :])%26]
+    shifts = shift_scores.argmax(axis=1)
+    kept = np.argsort(-shift_scores.max(axis=1), kind='stable')[:candidates]
+    columns, shifts = columns[kept], shifts[kept]
+    decryptions = ((letters[kept].astype(np.int64) - shifts[:, None])%26).astype(np.uint8)
+
+    keys = []
+    for order in best_column_orders(columns, decryptions, top, table):
+        k_m = inv(columns[order].T.tolist())
+        k_b = ((shifts[order] @ np.array(k_m))%26).tolist()
+        keys.append((k_m, k_b))
+    if len(keys) == 0:
+        return []
+    order, scores = rank_candidates(np.array([affine_hill_decrypt(ciphertext, key) for key in keys]), table)
+    return [(keys[i], float(s)) for i, s in zip(order, scores)]
 
 def affine_hill_decrypt_known_plaintext(plaintext: list[int], ciphertext: list[int]) -> tuple[list[list[int]], list[int]]:
     """
@@ -1,9 +1,11 @@
-from ciphertext import undigitize, is_valid
+import numpy as np
+from ciphertext import match_input, to_array, undigitize, is_valid
 import ciphertext
+from fitness import get_ngram_table, rank_candidates
 from utils import get_dictionary
 
 
-def autokey_encrypt(plaintext: list[int], key: int) -> list[int]:
+def autokey_encrypt(plaintext: list[int]|np.ndarray, key: int) -> list[int]|np.ndarray:
     """
     performs an autokey encryption by creating the keystream from the plaintext, starting from key
 
@@ -14,13 +16,31 @@ def autokey_encrypt(plaintext: list[int], key: int) -> list[int]:
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
-    keystream = [key] + [p for p in plaintext[:-1]]
-    ciphertext = [(p + k)%26 for p, k in zip(plaintext, keystream)]
-    return ciphertext
+    p = to_array(plaintext)
+    keystream = np.empty_like(p)
+    keystream[:1] = key%26
+    keystream[1:] = p[:-1]
+    return match_input((p + keystream)%26, plaintext)
 
-def autokey_decrypt(ciphertext: list[int], key: int) -> list[int]:
+def _alternating_sums(ciphertext: list[int]|np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    unrolls the autokey recurrence p_i = c_i - p_(i-1) into p_i = c_i - c_(i-1) + c_(i-2) - ... + (-1)^(i+1)*key
+
+    Arguments
+    ---------
+    ciphertext: the message
+
+    Returns
+    -------
+    the signs (-1)^i and the alternating sums c_i - c_(i-1) + ..., so p = (sums - signs*key)%26
+    """
+    c = np.asarray(ciphertext, dtype=np.int64)
+    signs = np.where(np.arange(len(c))%2 == 0, 1, -1)
+    return signs, signs*np.cumsum(signs*c)
+
+def autokey_decrypt(ciphertext: list[int]|np.ndarray, key: int) -> list[int]|np.ndarray:
     """
     performs an autokey decryption
 
@@ -31,32 +51,74 @@ def autokey_decrypt(ciphertext: list[int], key: int) -> list[int]:
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
-    plaintext = [(ciphertext[0] - key)%26]
-    for i in range(1, len(ciphertext)):
-        plaintext.append((ciphertext[i] - plaintext[-1])%26)
-    return plaintext
+    signs, sums = _alternating_sums(ciphertext)
+    return match_input((sums - signs*key)%26, ciphertext)
 
-def autokey_decrypt_exhaustive(ciphertext: list[int]) -> tuple[list[int], int]|None:
+def autokey_decrypt_exhaustive(ciphertext: list[int], dictionary: tuple[frozenset[str], int]|None = None, prefix_len: int = 80, prefix_req_score: float = 0.2) -> tuple[list[int], int]|None:
     """
     decrypts the autokey cipher by exhaustive search from key = 0 to 26
 
     Arguments
     ---------
     ciphertext: the message
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
+    prefix_len: candidates longer than this are first decrypted and checked on this many letters only
+    prefix_req_score: the score per letter the prefix must reach before the whole candidate is decrypted and checked, see ciphertext.is_valid
 
     Returns
     -------
     The plaintext with the key or None for no solution found
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
     for key in range(26):
+        # reject most wrong keys on a prefix before paying for the whole message
+        if len(ciphertext) > prefix_len:
+            prefix = undigitize(autokey_decrypt(ciphertext[:prefix_len], key), 'plain')
+            if not is_valid(prefix, words, prefix_req_score):
+                continue
         message = autokey_decrypt(ciphertext, key)
         alpha_text = undigitize(message, 'plain')
-        if is_valid(alpha_text, dictionary, max_word_len, 10):
+        if is_valid(alpha_text, words):
             return message, key
 
+def autokey_decrypt_all_keys(ciphertext: list[int]) -> np.ndarray:
+    """
+    decrypts the ciphertext under all 26 keys at once. Every row is the same alternating cumulative sum plus a signed key, see _alternating_sums
+
+    Arguments
+    ---------
+    ciphertext: the message
+
+    Returns
+    -------
+    a 26 x len(ciphertext) array whose row k is the plaintext for key k
+    """
+    signs, sums = _alternating_sums(ciphertext)
+    keys = np.arange(26)
+    return ((sums[None, :] - signs[None, :]*keys[:, None])%26).astype(np.uint8)
+
+def autokey_decrypt_ranked(ciphertext: list[int], table: np.ndarray|None = None) -> list[tuple[int, float]]:
+    """
+    scores the decryptions under every key with n-gram fitness in one batch
+
+    Arguments
+    ---------
+    ciphertext: the message
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+
+    Returns
+    -------
+    every key with its score, from best to worst
+    """
+    if table is None:
+        table = get_ngram_table()
+    order, scores = rank_candidates(autokey_decrypt_all_keys(ciphertext), table)
+    return [(int(k), float(s)) for k, s in zip(order, scores)]
+
 if __name__ == '__main__':
     from ciphertext import digitize
     plaintext = 'rendezvous'
@@ -73,3 +135,4 @@ if __name__ == '__main__':
     dplaintext, key = autokey_decrypt_exhaustive(dciphertext)
     plaintext = undigitize(dplaintext, 'plain')
     print(plaintext, key)
+    assert autokey_decrypt_ranked(dciphertext)[0][0] == key
@@ -0,0 +1,371 @@
+import argparse
+import json
+import platform
+import random
+import statistics
+import time
+from typing import Callable
+import numpy as np
+from ciphertext import digitize, digitize_array, undigitize
+from utils import get_dictionary
+from affine_cipher import affine_decrypt, affine_decrypt_frequency, affine_encrypt
+from affine_hill_cipher import affine_hill_decrypt, affine_hill_decrypt_ciphertext_only, affine_hill_decrypt_known_plaintext, affine_hill_encrypt
+from autokey_cipher import autokey_decrypt, autokey_decrypt_exhaustive, autokey_decrypt_ranked, autokey_encrypt
+from enigma import enigma_decrypt, enigma_decrypt_all_keys, enigma_encrypt, enigma_known_perm_decrypt_exhaustive, enigma_known_perm_decrypt_ranked
+from hill_cipher import hill_decrypt, hill_decrypt_ciphertext_only, hill_decrypt_columnwise, hill_decrypt_known_plaintext, hill_encrypt
+from permutation_cipher import permute_box_decryption, permute_box_decryption_exhaustive, permute_box_encryption, permute_decrypt, permute_decrypt_ciphertext_only, permute_encrypt, permute_mod_class_decrypt, permute_mod_class_decrypt_exhaustive, permute_mod_class_encrypt
+from shift_cipher import shift_decrypt, shift_decrypt_all_keys, shift_decrypt_exhaustive, shift_decrypt_ranked, shift_encrypt
+from substitution_cipher import sub_apply_keys, sub_decrypt, sub_decrypt_anneal, sub_decrypt_restarts, sub_encrypt, sub_key_array
+from vigenere_cipher import find_repeats, get_key_length_index_coincidence, get_key_length_kasiski, vigenere_decrypt, vigenere_decrypt_kasiski_index, vigenere_encrypt, vigenere_shift_decrypt, vigenere_shift_decrypt_index, vigenere_shift_encrypt
+
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+
+HILL_KEY = [[10, 5, 12], [3, 14, 21], [8, 9, 11]]
+HILL_2X2_KEY = [[11, 8], [3, 7]]
+AFFINE_HILL_KEY = ([[11, 8], [3, 7]], [4, 19])
+VIGENERE_KEY = digitize('cipher')
+PERMUTATION_KEY = [3, 0, 5, 1, 4, 2]
+PI = dict(enumerate([20, 7, 13, 2, 25, 11, 0, 18, 5, 22, 9, 15, 3, 24, 1, 16, 10, 21, 8, 14, 6, 23, 19, 4, 12, 17]))
+SUB_KEY = dict(zip('abcdefghijklmnopqrstuvwxyz', 'XNYAHPOGZQWBTSFLRCVMUEKJDI'))
+
+def make_plaintext(size: int, seed: int = 0) -> str:
+    """
+    builds a lowercase plaintext of dictionary words so the attacks have something english to find
+
+    Arguments
+    ---------
+    size: the number of letters
+    seed: the random seed
+
+    Returns
+    -------
+    the plaintext
+    """
+    words, _ = get_dictionary('./dictionary.txt')
+    # common short words keep the text segmentable without looking random
+    pool = sorted(w for w in words if w.isalpha() and 3 <= len(w) <= 8)
+    rng = random.Random(seed)
+    chunks, length = [], 0
+    while length < size:
+        word = rng.choice(pool)
+        chunks.append(word)
+        length += len(word)
+    return ''.join(chunks)[:size]
+
+# setups get the plaintext and return the leading arguments of the call to time, so building them stays out of the timing
+def text(plaintext: str) -> tuple[str]:
+    """
+    the plaintext as is
+    """
+    return plaintext,
+
+def letters(plaintext: str) -> tuple[list[str]]:
+    """
+    the plaintext as a list of characters
+    """
+    return list(plaintext),
+
+def digits(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the plaintext as a digit array
+    """
+    return digitize_array(plaintext),
+
+def shift_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the shift ciphertext as a digit array
+    """
+    return shift_encrypt(digitize_array(plaintext), 11),
+
+def shift_ciphertext_list(plaintext: str) -> tuple[list[int]]:
+    """
+    the shift ciphertext as a list of digits
+    """
+    return shift_encrypt(digitize(plaintext), 11),
+
+def affine_ciphertext_list(plaintext: str) -> tuple[list[int]]:
+    """
+    the affine ciphertext as a list of digits
+    """
+    return affine_encrypt(digitize(plaintext), (5, 8)),
+
+def vigenere_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the vigenere ciphertext as a digit array
+    """
+    return vigenere_encrypt(digitize_array(plaintext), VIGENERE_KEY),
+
+def vigenere_ciphertext_list(plaintext: str) -> tuple[list[int]]:
+    """
+    the vigenere ciphertext as a list of digits
+    """
+    return vigenere_encrypt(digitize(plaintext), VIGENERE_KEY),
+
+def vigenere_shift_ciphertext_list(plaintext: str) -> tuple[list[int]]:
+    """
+    the vigenere shift ciphertext as a list of digits
+    """
+    return vigenere_shift_encrypt(digitize(plaintext), VIGENERE_KEY),
+
+def autokey_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the autokey ciphertext as a digit array
+    """
+    return autokey_encrypt(digitize_array(plaintext), 8),
+
+def autokey_ciphertext_list(plaintext: str) -> tuple[list[int]]:
+    """
+    the autokey ciphertext as a list of digits
+    """
+    return autokey_encrypt(digitize(plaintext), 8),
+
+def enigma_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the enigma ciphertext as a digit array
+    """
+    return enigma_encrypt(digitize_array(plaintext), PI, 5),
+
+def enigma_ciphertext_list(plaintext: str) -> tuple[list[int]]:
+    """
+    the enigma ciphertext as a list of digits
+    """
+    return enigma_encrypt(digitize(plaintext), PI, 5),
+
+def hill_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the 3x3 hill ciphertext as a digit array
+    """
+    return hill_encrypt(digitize_array(plaintext), HILL_KEY),
+
+def hill_2x2_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the 2x2 hill ciphertext as a digit array
+    """
+    return hill_encrypt(digitize_array(plaintext), HILL_2X2_KEY),
+
+def hill_crib(plaintext: str) -> tuple[list[int], list[int]]:
+    """
+    the whole blocks of the plaintext and their 3x3 hill ciphertext as lists of digits
+    """
+    crib = digitize(plaintext[:len(plaintext) - len(plaintext)%3])
+    return crib, hill_encrypt(crib, HILL_KEY)
+
+def affine_hill_ciphertext(plaintext: str) -> tuple[np.ndarray]:
+    """
+    the affine hill ciphertext as a digit array
+    """
+    return affine_hill_encrypt(digitize_array(plaintext), AFFINE_HILL_KEY),
+
+def affine_hill_crib(plaintext: str) -> tuple[list[int], list[int]]:
+    """
+    the whole blocks of the plaintext and their affine hill ciphertext as lists of digits
+    """
+    crib = digitize(plaintext[:len(plaintext) - len(plaintext)%2])
+    return crib, affine_hill_encrypt(crib, AFFINE_HILL_KEY)
+
+def permute_ciphertext(plaintext: str) -> tuple[list[str]]:
+    """
+    the block permutation ciphertext as a list of characters
+    """
+    return permute_encrypt(list(plaintext), PERMUTATION_KEY),
+
+def mod_class_ciphertext(plaintext: str) -> tuple[list[str]]:
+    """
+    the mod class permutation ciphertext as a list of characters
+    """
+    return permute_mod_class_encrypt(list(plaintext), 7),
+
+def box_ciphertext(plaintext: str) -> tuple[list[str]]:
+    """
+    the box permutation ciphertext as a list of characters
+    """
+    return permute_box_encryption(list(plaintext), 3, 4),
+
+def sub_ciphertext(plaintext: str) -> tuple[str]:
+    """
+    the substitution ciphertext
+    """
+    return sub_encrypt(plaintext, SUB_KEY),
+
+def sub_keys(plaintext: str) -> tuple[np.ndarray, np.ndarray]:
+    """
+    the plaintext as a digit array and 100 substitution keys to apply to it
+    """
+    return digitize_array(plaintext), np.stack([np.roll(sub_key_array(SUB_KEY), i) for i in range(100)])
+
+# name -> (largest size worth timing, the function to time, its setup, the arguments after the setup's)
+CASES: dict[str, tuple[int, Callable[..., object], Callable[[str], tuple], tuple]] = {
+    'digitize': (10_000_000, digitize, text, ()),
+    'digitize_array': (10_000_000, digitize_array, text, ()),
+    'undigitize': (10_000_000, undigitize, digits, ('plain',)),
+
+    'shift_encrypt': (10_000_000, shift_encrypt, digits, (11,)),
+    'shift_decrypt': (10_000_000, shift_decrypt, digits, (11,)),
+    'shift_decrypt_all_keys': (1_000_000, shift_decrypt_all_keys, shift_ciphertext, ()),
+    'shift_decrypt_ranked': (1_000_000, shift_decrypt_ranked, shift_ciphertext, ()),
+    'shift_decrypt_exhaustive': (100_000, shift_decrypt_exhaustive, shift_ciphertext_list, ()),
+
+    'affine_encrypt': (10_000_000, affine_encrypt, digits, ((5, 8),)),
+    'affine_decrypt': (10_000_000, affine_decrypt, digits, ((5, 8),)),
+    'affine_decrypt_frequency': (100_000, affine_decrypt_frequency, affine_ciphertext_list, ()),
+
+    'vigenere_encrypt': (10_000_000, vigenere_encrypt, digits, (VIGENERE_KEY,)),
+    'vigenere_decrypt': (10_000_000, vigenere_decrypt, digits, (VIGENERE_KEY,)),
+    'vigenere_shift_encrypt': (10_000_000, vigenere_shift_encrypt, digits, (VIGENERE_KEY,)),
+    'vigenere_shift_decrypt': (10_000_000, vigenere_shift_decrypt, digits, (VIGENERE_KEY,)),
+    'get_key_length_kasiski': (1_000_000, get_key_length_kasiski, vigenere_ciphertext_list, (10,)),
+    'find_repeats': (1_000_000, find_repeats, vigenere_ciphertext, ()),
+    'get_key_length_index_coincidence': (100_000, get_key_length_index_coincidence, vigenere_ciphertext_list, (10,)),
+    'vigenere_decrypt_kasiski_index': (100_000, vigenere_decrypt_kasiski_index, vigenere_ciphertext_list, ('index',)),
+    'vigenere_shift_decrypt_index': (100_000, vigenere_shift_decrypt_index, vigenere_shift_ciphertext_list, ()),
+
+    'autokey_encrypt': (10_000_000, autokey_encrypt, digits, (8,)),
+    'autokey_decrypt': (10_000_000, autokey_decrypt, digits, (8,)),
+    'autokey_decrypt_ranked': (1_000_000, autokey_decrypt_ranked, autokey_ciphertext, ()),
+    'autokey_decrypt_exhaustive': (100_000, autokey_decrypt_exhaustive, autokey_ciphertext_list, ()),
+
+    'enigma_encrypt': (10_000_000, enigma_encrypt, digits, (PI, 5)),
+    'enigma_decrypt': (10_000_000, enigma_decrypt, digits, (PI, 5)),
+    'enigma_decrypt_all_keys': (1_000_000, enigma_decrypt_all_keys, enigma_ciphertext, (PI,)),
+    'enigma_known_perm_decrypt_ranked': (1_000_000, enigma_known_perm_decrypt_ranked, enigma_ciphertext, (PI,)),
+    'enigma_known_perm_decrypt_exhaustive': (100_000, enigma_known_perm_decrypt_exhaustive, enigma_ciphertext_list, (PI,)),
+
+    'hill_encrypt': (1_000_000, hill_encrypt, digits, (HILL_KEY,)),
+    'hill_decrypt': (1_000_000, hill_decrypt, hill_ciphertext, (HILL_KEY,)),
+    'hill_decrypt_known_plaintext': (10_000, hill_decrypt_known_plaintext, hill_crib, ()),
+    'hill_decrypt_ciphertext_only': (100_000, hill_decrypt_ciphertext_only, hill_2x2_ciphertext, ()),
+    'hill_decrypt_columnwise': (100_000, hill_decrypt_columnwise, hill_ciphertext, (3,)),
+
+    'affine_hill_encrypt': (1_000_000, affine_hill_encrypt, digits, (AFFINE_HILL_KEY,)),
+    'affine_hill_decrypt': (1_000_000, affine_hill_decrypt, affine_hill_ciphertext, (AFFINE_HILL_KEY,)),
+    'affine_hill_decrypt_known_plaintext': (10_000, affine_hill_decrypt_known_plaintext, affine_hill_crib, ()),
+    'affine_hill_decrypt_ciphertext_only': (100_000, affine_hill_decrypt_ciphertext_only, affine_hill_ciphertext, (2,)),
+
+    'permute_encrypt': (1_000_000, permute_encrypt, letters, (PERMUTATION_KEY,)),
+    'permute_decrypt': (1_000_000, permute_decrypt, permute_ciphertext, (PERMUTATION_KEY,)),
+    'permute_decrypt_ciphertext_only': (100_000, permute_decrypt_ciphertext_only, permute_ciphertext, (len(PERMUTATION_KEY),)),
+    'permute_mod_class_encrypt': (1_000_000, permute_mod_class_encrypt, letters, (7,)),
+    'permute_mod_class_decrypt': (1_000_000, permute_mod_class_decrypt, mod_class_ciphertext, (7,)),
+    'permute_mod_class_decrypt_exhaustive': (10_000, permute_mod_class_decrypt_exhaustive, mod_class_ciphertext, ()),
+    'permute_box_encryption': (1_000_000, permute_box_encryption, letters, (3, 4)),
+    'permute_box_decryption': (1_000_000, permute_box_decryption, box_ciphertext, (3, 4)),
+    'permute_box_decryption_exhaustive': (100_000, permute_box_decryption_exhaustive, box_ciphertext, ()),
+
+    'sub_encrypt': (10_000_000, sub_encrypt, text, (SUB_KEY,)),
+    'sub_decrypt': (10_000_000, sub_decrypt, sub_ciphertext, (SUB_KEY,)),
+    'sub_apply_keys': (1_000_000, sub_apply_keys, sub_keys, ()),
+    'sub_decrypt_anneal': (100_000, sub_decrypt_anneal, sub_ciphertext, ()),
+    'sub_decrypt_restarts': (10_000, sub_decrypt_restarts, sub_ciphertext, ()),
+}
+
+def time_case(function: Callable[..., object], args: tuple, repeat: int) -> list[float]:
+    """
+    times a call
+
+    Arguments
+    ---------
+    function: the function to call
+    args: its arguments, built beforehand
+    repeat: the number of timed runs
+
+    Returns
+    -------
+    the seconds of each run
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return times
+
+def run(sizes: list[int], names: list[str], repeat: int) -> dict:
+    """
+    times every case at every size up to its limit
+
+    Arguments
+    ---------
+    sizes: the message sizes in letters
+    names: the cases to run
+    repeat: the number of timed runs per case and size
+
+    Returns
+    -------
+    the report, ready for json
+    """
+    # warm the dictionary, word automaton and n-gram caches so the first case does not pay for them
+    shift_decrypt_exhaustive(digitize('warmupthecaches'))
+    shift_decrypt_ranked(digitize('warmupthecaches'))
+
+    plaintext = make_plaintext(max(sizes))
+    results = []
+    for name in names:
+        limit, function, setup, extra = CASES[name]
+        for size in sizes:
+            if size > limit:
+                continue
+            args = setup(plaintext[:size]) + extra
+            times = time_case(function, args, repeat)
+            best = min(times)
+            results.append({
+                'name': name,
+                'size': size,
+                'repeat': repeat,
+                'best': best,
+                'median': statistics.median(times),
+                'chars_per_sec': size/best if best > 0 else float('inf'),
+            })
+            print(f'{name:40} {size:>10} {best*1e3:12.3f} ms {size/best/1e6 if best > 0 else float("inf"):10.3f} M chars/s', flush=True)
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+def compare(old: dict, new: dict, tolerance: float) -> list[str]:
+    """
+    finds the cases that got slower between two reports
+
+    Arguments
+    ---------
+    old: the baseline report
+    new: the current report
+    tolerance: the allowed slowdown, 0.2 lets a case take 20% longer
+
+    Returns
+    -------
+    a line per regression
+    """
+    baseline = {(r['name'], r['size']): r['best'] for r in old['results']}
+    regressions = []
+    for r in new['results']:
+        before = baseline.get((r['name'], r['size']))
+        if before is not None and r['best'] > before*(1 + tolerance):
+            regressions.append(f'{r["name"]} at {r["size"]}: {before*1e3:.3f} ms -> {r["best"]*1e3:.3f} ms ({r["best"]/before:.2f}x)')
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='times every cipher, decryption and attack across message sizes')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='message sizes in letters')
+    parser.add_argument('--only', nargs='+', default=None, help='run only the cases whose name contains one of these')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per case and size')
+    parser.add_argument('--output', default='./bench_output.json', help='where to write the json report')
+    parser.add_argument('--compare', default=None, help='a previous json report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against --compare')
+    args = parser.parse_args()
+
+    names = [n for n in CASES if args.only is None or any(o in n for o in args.only)]
+    report = run(sorted(args.sizes), names, args.repeat)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            raise SystemExit(1)
@@ -1,5 +1,9 @@
+import mmap
+import os
 import re
-from typing import Literal
+import numpy as np
+from typing import Iterator, Literal
+from utils import get_word_automaton
 
 
 def read(file: str, state: str) -> str:
@@ -26,6 +30,88 @@ def read(file: str, state: str) -> str:
     text = re.sub(r'\s+', '', text).strip()
     return text
 
+# bytes.translate delete sets keeping only the letters of each state
+_NOT_UPPER = bytes(c for c in range(256) if not ord('A') <= c <= ord('Z'))
+_NOT_LOWER = bytes(c for c in range(256) if not ord('a') <= c <= ord('z'))
+
+def _letter_filter(state: str) -> tuple[bytes, int]:
+    """
+    the bytes to delete and the digitizing base of a state
+
+    Arguments
+    ---------
+    state: options are 'cipher' or 'plain'
+
+    Returns
+    -------
+    the delete set for bytes.translate and ord('A') or ord('a')
+    """
+    if state == 'cipher':
+        return _NOT_UPPER, ord('A')
+    elif state == 'plain':
+        return _NOT_LOWER, ord('a')
+    raise ValueError(f'{state} is not an option. Only \'cipher\' or \'plain\'')
+
+def read_chunks(file: str, state: str, chunk_size: int = 1 << 20) -> Iterator[np.ndarray]:
+    """
+    reads a txt file a block at a time and yields its letters digitized, so memory stays bounded by chunk_size whatever the file size
+
+    Arguments
+    ---------
+    file: the directory
+    state: options are 'cipher' or 'plain', only upper or lower case letters are kept respectively
+    chunk_size: the number of letters in every yielded chunk but the last
+
+    Returns
+    -------
+    uint8 arrays of chunk_size digitized letters
+    """
+    delete, base = _letter_filter(state)
+    buffer = np.empty(chunk_size, dtype=np.uint8)
+    filled = 0
+    with open(file, 'rb') as f:
+        while block := f.read(chunk_size):
+            letters = np.frombuffer(block.translate(None, delete), dtype=np.uint8)
+            while len(letters):
+                n = min(chunk_size - filled, len(letters))
+                np.subtract(letters[:n], base, out=buffer[filled:filled + n])
+                filled += n
+                letters = letters[n:]
+                if filled == chunk_size:
+                    yield buffer.copy()
+                    filled = 0
+    if filled:
+        yield buffer[:filled].copy()
+
+def read_array(file: str, state: str, chunk_size: int = 1 << 20) -> np.ndarray:
+    """
+    reads a txt file through a memory map straight into a preallocated uint8 array of digitized letters, without holding the text as a str
+
+    Arguments
+    ---------
+    file: the directory
+    state: options are 'cipher' or 'plain', only upper or lower case letters are kept respectively
+    chunk_size: the number of bytes filtered at a time
+
+    Returns
+    -------
+    the digitized letters
+    """
+    delete, base = _letter_filter(state)
+    with open(file, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        digital = np.empty(size, dtype=np.uint8)
+        filled = 0
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start in range(0, size, chunk_size):
+                    letters = np.frombuffer(mm[start:start + chunk_size].translate(None, delete), dtype=np.uint8)
+                    np.subtract(letters, base, out=digital[filled:filled + len(letters)])
+                    filled += len(letters)
+    if filled == 0:
+        raise ValueError(f'given text has no letters for the given state: {state}')
+    return digital[:filled]
+
 def digitize(message: str) -> list[int]:
     """
     mapping 'a' -> 0, 'b' -> 1, ..., 'z' -> 25
@@ -48,9 +134,112 @@ def digitize(message: str) -> list[int]:
         digital.append(ord(ch) - base)
     return digital
 
-def undigitize(message: list[int], state: Literal['cipher', 'plain']) -> str:
+def digitize_array(message: str|bytes) -> np.ndarray:
+    """
+    mapping 'a' -> 0, 'b' -> 1, ..., 'z' -> 25 into a uint8 array, without going through python ints
+
+    Arguments
+    ---------
+    message: the alpha text
+
+    Returns
+    -------
+    the uint8 array of digital numbers
+    """
+    if isinstance(message, str):
+        message = message.encode('ascii')
+    base = ord('A') if message.isupper() else ord('a')
+    return np.frombuffer(message, dtype=np.uint8) - np.uint8(base)
+
+def to_array(message: list[int]|np.ndarray) -> np.ndarray:
+    """
+    views a digital message as an int16 array so arithmetic on it can go negative or past 255 before the % 26
+
+    Arguments
+    ---------
+    message: the digital message as a list or array
+
+    Returns
+    -------
+    the int16 array
+    """
+    return np.asarray(message, dtype=np.int16)
+
+def to_digits(message: list[int]|np.ndarray) -> np.ndarray:
     """
-    turns message from a list of ints into a string
+    the digital message as a uint8 array with every value in 0..25. uint8 arrays are taken as already reduced and are not copied
+
+    Arguments
+    ---------
+    message: the digital message as a list or array
+
+    Returns
+    -------
+    the uint8 array
+    """
+    if isinstance(message, np.ndarray) and message.dtype == np.uint8:
+        return message
+    return (np.asarray(message, dtype=np.int64)%26).astype(np.uint8)
+
+# byte i -> i%26, reduces the sum of two digits in one bytes.translate
+MOD_26 = bytes(i%26 for i in range(256))
+
+def letter_table(letters: list[int]) -> bytes:
+    """
+    builds a bytes.translate table sending each digit to a new digit
+
+    Arguments
+    ---------
+    letters: where 0, 1, ..., 25 go
+
+    Returns
+    -------
+    the 256 byte table, byte i goes to letters[i%26]
+    """
+    return bytes(letters[i%26] for i in range(256))
+
+def apply_table(message: list[int]|np.ndarray, table: bytes) -> list[int]|np.ndarray:
+    """
+    sends every digit of the message through a translate table, see letter_table. This is a single C pass over the bytes
+
+    Arguments
+    ---------
+    message: the digital message as a list or array
+    table: the 256 byte table
+
+    Returns
+    -------
+    the translated message, in the same form as the message
+    """
+    if isinstance(message, np.ndarray):
+        data = bytearray(np.ascontiguousarray(to_digits(message)))
+        return np.frombuffer(data.translate(table), dtype=np.uint8)
+    try:
+        data = bytearray(message)
+    except (ValueError, TypeError):
+        data = bytearray(to_digits(message))
+    return list(data.translate(table))
+
+def match_input(result: np.ndarray, message: list[int]|np.ndarray) -> list[int]|np.ndarray:
+    """
+    returns a digital result in the same form as the message it was computed from: a uint8 array for arrays, a list of ints for lists
+
+    Arguments
+    ---------
+    result: the digital result, already reduced mod 26
+    message: the input message
+
+    Returns
+    -------
+    the result as a uint8 array or a list
+    """
+    if isinstance(message, np.ndarray):
+        return result.astype(np.uint8, copy=False)
+    return result.tolist()
+
+def undigitize(message: list[int]|np.ndarray, state: Literal['cipher', 'plain']) -> str:
+    """
+    turns message from a list or array of ints into a string
 
     Arguments
     ---------
@@ -67,51 +256,90 @@ def undigitize(message: list[int], state: Literal['cipher', 'plain']) -> str:
     elif state == 'plain':
         base = ord('a')
 
+    if isinstance(message, np.ndarray):
+        return (message.astype(np.uint8) + np.uint8(base)).tobytes().decode('ascii')
     for val in message:
         chars.append(chr(base + val))
     return "".join(chars)
 
-def is_valid(message: str, dictionary: list[str], max_word_len: int, min_req_score: int = 4) -> bool:
+def segment(message: str, dictionary: frozenset[str]) -> tuple[bool, int]:
     """
-    checks if the message is valid by seeing if successive words are in a dictionary
+    finds every dictionary word in the message in one pass of the word automaton and runs the segmentation dp over them
 
     Arguments
     ---------
     message: the alpha message
-    dictionary: the dictionary, duh
-    max_word_len: the longest word length in the dictionary
+    dictionary: the dictionary as returned by utils.get_dictionary
 
     Returns
     -------
-    as expected
+    whether the whole message splits into words, and the best score of non-overlapping words where each word of length l >= 4 scores l - 3
     """
-    # see if whole text is valid English
+    goto, fail, out = get_word_automaton(dictionary)
     n = len(message)
-    max_word_len = min(max_word_len, n)
-    dp = [False]*(n + 1)
-    prev = [-1]*(n+1)
-    dp[0] = True
+    # covered[i]: message[:i] splits into words. best[i]: best score within message[:i]
+    covered = [False]*(n + 1)
+    best = [0]*(n + 1)
+    covered[0] = True
 
+    state = 0
     for i in range(1, n + 1):
-        start = max(0, i - max_word_len)
-        for j in range(start, i):
-            if dp[j]:
-                word = message[j:i]
-                if word in dictionary:
-                    dp[i] = True
-                    prev[i] = j
-                    break
-    if dp[n]:
-        return True
-
-    # if can beat min_req_score
-    score = 0
-    for len_word in range(10, 3, -1):
-        for j in range(0, len(message), len_word):
-            if message[j:j+len_word] in dictionary:
-                score += len_word - 3
-                message = message[:j] + message[j+len_word+1:]
-        if score >= min_req_score:
-            return True
-
-    return False
+        ch = message[i - 1]
+        while ch not in goto[state] and state != 0:
+            state = fail[state]
+        state = goto[state].get(ch, 0)
+
+        score = best[i - 1]
+        for length in out[state]:
+            j = i - length
+            covered[i] = covered[i] or covered[j]
+            if length > 3 and best[j] + length - 3 > score:
+                score = best[j] + length - 3
+        best[i] = score
+    return covered[n], best[n]
+
+def segmentation_score(message: str, dictionary: frozenset[str]) -> float:
+    """
+    scores the message by its maximum coverage with dictionary words per letter so candidates can be ranked whatever their length. See segment
+
+    Arguments
+    ---------
+    message: the alpha message
+    dictionary: the dictionary as returned by utils.get_dictionary
+
+    Returns
+    -------
+    the score per letter, higher is more english
+    """
+    return segment(message, dictionary)[1]/len(message) if message else 0.0
+
+def is_valid(message: str, dictionary: frozenset[str], min_req_score: float = 0.2) -> bool:
+    """
+    checks if the message is valid by seeing if it splits into dictionary words or scores at least min_req_score per letter. See segment
+
+    Arguments
+    ---------
+    message: the alpha message
+    dictionary: the dictionary as returned by utils.get_dictionary
+    min_req_score: the score per letter needed when the message does not split into words entirely. English scores about 0.3 to 0.4 and wrong keys rarely reach 0.1, at any length
+
+    Returns
+    -------
+    as expected
+    """
+    if not isinstance(dictionary, frozenset):
+        dictionary = frozenset(dictionary)
+    covered, score = segment(message, dictionary)
+    return covered or score >= min_req_score*len(message)
+
+if __name__ == '__main__':
+    from utils import get_dictionary
+    words, _ = get_dictionary('./dictionary.txt')
+
+    # wrong keys must not pass more often as the text gets longer
+    plaintext = 'itwasthebestoftimesitwastheworstoftimesitwastheageofwisdomitwastheageoffoolishness'*30
+    assert is_valid(plaintext, words)
+    for key in range(1, 26):
+        assert not is_valid(''.join(chr((ord(c) - ord('a') + key)%26 + ord('a')) for c in plaintext), words)
+    for key in range(2, 40):
+        assert not is_valid(''.join(plaintext[i] for c in range(key) for i in range(c, len(plaintext), key)), words)
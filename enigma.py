@@ -1,8 +1,29 @@
+import numpy as np
 from utils import get_dictionary
-from ciphertext import is_valid, undigitize
+from ciphertext import is_valid, match_input, to_array, undigitize
+from fitness import get_ngram_table, rank_candidates
 
 
-def enigma_encrypt(plaintext: list[int], pi: dict[int, int], key: int) -> list[int]:
+def _permutation_arrays(pi: dict[int, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    turns the permutation into lookup arrays
+
+    Arguments
+    ---------
+    pi: the permutation in Z26
+
+    Returns
+    -------
+    pi and its inverse as arrays indexed by letter
+    """
+    pi_arr = np.zeros(26, dtype=np.int16)
+    pi_inv = np.zeros(26, dtype=np.int16)
+    for k, v in pi.items():
+        pi_arr[k] = v
+        pi_inv[v] = k
+    return pi_arr, pi_inv
+
+def enigma_encrypt(plaintext: list[int]|np.ndarray, pi: dict[int, int], key: int) -> list[int]|np.ndarray:
     """
     performs this engimaesque encryption by first running the plaintext through the permutation (pi), then adding it to the keystream. This is done by pi(x) + (key + i - 1)mod26
 
@@ -14,14 +35,14 @@ def enigma_encrypt(plaintext: list[int], pi: dict[int, int], key: int) -> list[i
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
-    ciphertext = plaintext.copy()
-    for i in range(len(ciphertext)):
-        ciphertext[i] = (pi[ciphertext[i]] + key + i - 1)%26
-    return ciphertext
+    pi_arr, _ = _permutation_arrays(pi)
+    p = to_array(plaintext)
+    offsets = (np.arange(len(p)) + key - 1)%26
+    return match_input((pi_arr[p] + offsets)%26, plaintext)
 
-def enigma_decrypt(ciphertext: list[int], pi: dict[int, int], key: int) -> list[int]:
+def enigma_decrypt(ciphertext: list[int]|np.ndarray, pi: dict[int, int], key: int) -> list[int]|np.ndarray:
     """
     decrypts the enigmaesque by pi^{-1}(y - (key + i - 1))%26
 
@@ -33,15 +54,14 @@ def enigma_decrypt(ciphertext: list[int], pi: dict[int, int], key: int) -> list[
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
-    plaintext = ciphertext.copy()
-    pi_inv = {v:k for k, v in pi.items()}
-    for i in range(len(plaintext)):
-        plaintext[i] = pi_inv[(plaintext[i] - (key + i - 1))%26]
-    return plaintext
+    _, pi_inv = _permutation_arrays(pi)
+    c = to_array(ciphertext)
+    offsets = (np.arange(len(c)) + key - 1)%26
+    return match_input(pi_inv[(c - offsets)%26], ciphertext)
 
-def enigma_known_perm_decrypt_exhaustive(ciphertext: list[int], pi: dict[int, int]) -> tuple[list[int], int]|None:
+def enigma_known_perm_decrypt_exhaustive(ciphertext: list[int], pi: dict[int, int], dictionary: tuple[frozenset[str], int]|None = None, prefix_len: int = 80, prefix_req_score: float = 0.2) -> tuple[list[int], int]|None:
     """
     decrypts by exhaustion a known permutation.
 
@@ -49,14 +69,61 @@ def enigma_known_perm_decrypt_exhaustive(ciphertext: list[int], pi: dict[int, in
     ---------
     ciphertext: the message
     pi: the permutation
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
+    prefix_len: candidates longer than this are first decrypted and checked on this many letters only
+    prefix_req_score: the score per letter the prefix must reach before the whole candidate is decrypted and checked, see ciphertext.is_valid
 
     Returns
     -------
     the message and the key or None if no solution found
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
     for key in range(26):
+        # reject most wrong keys on a prefix before paying for the whole message
+        if len(ciphertext) > prefix_len:
+            prefix = undigitize(enigma_decrypt(ciphertext[:prefix_len], pi, key), 'plain')
+            if not is_valid(prefix, words, prefix_req_score):
+                continue
         message = enigma_decrypt(ciphertext, pi, key)
         alpha_text = undigitize(message, 'plain')
-        if is_valid(alpha_text, dictionary, max_word_len, min_req_score=10):
+        if is_valid(alpha_text, words):
             return message, key
+
+def enigma_decrypt_all_keys(ciphertext: list[int], pi: dict[int, int]) -> np.ndarray:
+    """
+    decrypts the ciphertext under all 26 keystream keys at once
+
+    Arguments
+    ---------
+    ciphertext: the message
+    pi: the permutation
+
+    Returns
+    -------
+    a 26 x len(ciphertext) array whose row k is the plaintext for key k
+    """
+    _, pi_inv = _permutation_arrays(pi)
+    c = np.asarray(ciphertext, dtype=np.int64)
+    offsets = c - np.arange(len(c)) + 1
+    return pi_inv[(offsets[None, :] - np.arange(26)[:, None])%26].astype(np.uint8)
+
+def enigma_known_perm_decrypt_ranked(ciphertext: list[int], pi: dict[int, int], table: np.ndarray|None = None) -> list[tuple[int, float]]:
+    """
+    scores the decryptions under every keystream key with n-gram fitness in one batch
+
+    Arguments
+    ---------
+    ciphertext: the message
+    pi: the permutation
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+
+    Returns
+    -------
+    every key with its score, from best to worst
+    """
+    if table is None:
+        table = get_ngram_table()
+    order, scores = rank_candidates(enigma_decrypt_all_keys(ciphertext, pi), table)
+    return [(int(k), float(s)) for k, s in zip(order, scores)]
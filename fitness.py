@@ -0,0 +1,130 @@
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+# keeps lowercase letters, turns newlines into '{' (26 after digitizing) and drops everything else
+_CORPUS_TABLE = bytes.maketrans(b'\n', b'{')
+_CORPUS_DELETE = bytes(c for c in range(256) if not (ord('a') <= c <= ord('z') or c == ord('\n')))
+
+# (absolute path, mtime, n) -> table
+_table_cache: dict[tuple[str, int, int], np.ndarray] = {}
+
+def build_ngram_table(corpus: str, n: int = 4) -> np.ndarray:
+    """
+    counts the n-grams of a text file and turns them into log10 probabilities. n-grams run across spaces and punctuation but not across lines, so a one word per line dictionary gives in-word n-grams only
+
+    Arguments
+    ---------
+    corpus: the directory of the text
+    n: the n-gram length
+
+    Returns
+    -------
+    a float32 array of length 26^n indexed by the n-gram in base 26, unseen n-grams get log10(0.01/total)
+    """
+    with open(corpus, 'rb') as f:
+        text = f.read().lower().translate(_CORPUS_TABLE, _CORPUS_DELETE)
+    digits = np.frombuffer(text, dtype=np.uint8) - ord('a')
+    if len(digits) < n:
+        raise ValueError(f'{corpus} has no {n}-grams')
+
+    windows = sliding_window_view(digits, n)
+    windows = windows[(windows < 26).all(axis=1)]
+    indices = windows.astype(np.int64) @ (26**np.arange(n - 1, -1, -1))
+    counts = np.bincount(indices, minlength=26**n)
+    total = counts.sum()
+    if total == 0:
+        raise ValueError(f'{corpus} has no {n}-grams')
+    table = np.full(26**n, np.log10(0.01/total), dtype=np.float32)
+    seen = counts > 0
+    table[seen] = np.log10(counts[seen]/total)
+    return table
+
+def get_ngram_table(corpus: str = './dictionary.txt', n: int = 4, cache: str|None = None) -> np.ndarray:
+    """
+    the n-gram log probability table of a corpus, built once per process and rebuilt when the corpus changes
+
+    Arguments
+    ---------
+    corpus: the directory of the text
+    n: the n-gram length
+    cache: optional directory of a .npy copy of the table. It is loaded instead of counting the corpus when newer than it, and (re)written otherwise
+
+    Returns
+    -------
+    the table, see build_ngram_table
+    """
+    path = os.path.abspath(corpus)
+    mtime = os.stat(path).st_mtime_ns
+    key = (path, mtime, n)
+    table = _table_cache.get(key)
+    if table is not None:
+        return table
+
+    if cache is not None and os.path.exists(cache) and os.stat(cache).st_mtime_ns >= mtime:
+        table = np.load(cache)
+        if table.shape != (26**n,):
+            table = None
+    if table is None:
+        table = build_ngram_table(path, n)
+        if cache is not None:
+            np.save(cache, table)
+    _table_cache[key] = table
+    return table
+
+def ngram_indices(texts: np.ndarray, n: int) -> np.ndarray:
+    """
+    the base 26 index of every n-gram of each text
+
+    Arguments
+    ---------
+    texts: the digital texts, one per row (or a single 1d text)
+    n: the n-gram length
+
+    Returns
+    -------
+    an int array with one row per text and len - n + 1 columns
+    """
+    texts = np.atleast_2d(texts)
+    length = texts.shape[1] - n + 1
+    if length <= 0:
+        return np.zeros((texts.shape[0], 0), dtype=np.int32)
+    indices = texts[:, :length].astype(np.int32)
+    for i in range(1, n):
+        indices = indices*26 + texts[:, i:i + length]
+    return indices
+
+def ngram_score(texts: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """
+    scores every text by the sum of its n-gram log probabilities, in one vectorized call
+
+    Arguments
+    ---------
+    texts: the digital texts, one per row (or a single 1d text), all the same length
+    table: the n-gram table, see get_ngram_table
+
+    Returns
+    -------
+    the score of each text, higher is more english
+    """
+    n = round(np.log(len(table))/np.log(26))
+    indices = ngram_indices(texts, n)
+    return table[indices].sum(axis=1, dtype=np.float64)
+
+def rank_candidates(texts: np.ndarray, table: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    orders candidate plaintexts from most to least english
+
+    Arguments
+    ---------
+    texts: the digital candidate plaintexts, one per row
+    table: the n-gram table, see get_ngram_table
+
+    Returns
+    -------
+    the row indices from best to worst and their scores
+    """
+    scores = ngram_score(texts, table)
+    order = np.argsort(-scores, kind='stable')
+    return order, scores[order]
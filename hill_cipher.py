@@ -1,104 +1,354 @@
-from math import gcd, sqrt
+from functools import lru_cache
+from itertools import permutations
+from math import gcd
 from mod_algebra import *
-from utils import get_common_digrams, get_digram_counts
-from ciphertext import digitize, undigitize
+from parallel import parallel_map
+from utils import get_common_digrams, get_digram_counts, get_normal_letter_probabilities
+from ciphertext import digitize, match_input, to_array, undigitize
+from fitness import get_ngram_table, ngram_score, rank_candidates
+import numpy as np
 import os
 
 
-def hill_encrypt(plaintext: list[int], key: list[list[int]]) -> list[int]:
+@lru_cache(maxsize=256)
+def _key_arrays(key: tuple[tuple[int, ...], ...]) -> tuple[np.ndarray, np.ndarray]:
     """
-    performs a hill encryption by y = plaintext@key
+    the key and its inverse as arrays, computed once per key
 
     Arguments
     ---------
-    plaintext: the message
-    key: the linear transormation key
+    key: the linear transformation key as a tuple of rows
 
     Returns
     -------
-    the ciphertext
+    the key and its inverse mod 26, int64 arrays
     """
-    m = len(key)
-    # test if key is valid
-    key_det = det(key)
+    key_det = det([list(row) for row in key])
     if key_det == 0 or gcd(key_det, 26) != 1:
         raise ValueError("key is non-invertible")
-    # pad
-    r = len(plaintext)%m
+    k = np.array(key, dtype=np.int64)%26
+    k_inv = np.array(inv([list(row) for row in key]), dtype=np.int64)
+    k.flags.writeable = False
+    k_inv.flags.writeable = False
+    return k, k_inv
+
+def hill_key_arrays(key: list[list[int]]|np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    the key and its inverse as read only arrays, cached between calls
+
+    Arguments
+    ---------
+    key: the linear transformation key
+
+    Returns
+    -------
+    the key and its inverse mod 26
+    """
+    return _key_arrays(tuple(tuple(int(k) for k in row) for row in key))
+
+def to_blocks(message: list[int]|np.ndarray, m: int, pad: bool) -> np.ndarray:
+    """
+    lays a message out as one row per block of m letters, without touching the message
+
+    Arguments
+    ---------
+    message: the digital message
+    m: the block size
+    pad: whether to pad the last block with 1s (b), otherwise a partial block is an error
+
+    Returns
+    -------
+    an int64 array of shape (ceil(n/m), m)
+    """
+    blocks = to_array(message).astype(np.int64)
+    r = len(blocks)%m
     if r != 0:
-        plaintext += [1]*(m - r)
-    ciphertext = []
-    for i in range(0, len(plaintext), m):
-        c = mult([plaintext[i:i+m]], key)
-        ciphertext += c[0]
-    return ciphertext
+        if not pad:
+            raise ValueError(f"the message length is not a multiple of {m}")
+        blocks = np.concatenate((blocks, np.ones(m - r, dtype=np.int64)))
+    return blocks.reshape(-1, m)
 
-def hill_decrypt(ciphertext: list[int], key: list[list[int]]) -> list[int]:
+def hill_encrypt(plaintext: list[int]|np.ndarray, key: list[list[int]]) -> list[int]|np.ndarray:
     """
-    performs a hill decryption by plaintext = y@key^(-1)
+    performs a hill encryption by y = plaintext@key, every block at once
 
     Arguments
     ---------
-    ciphertext: the message
+    plaintext: the message, padded with 1s (b) to a multiple of the key size
+    key: the linear transormation key
+
+    Returns
+    -------
+    the ciphertext, in the same form as the plaintext
+    """
+    k, _ = hill_key_arrays(key)
+    ciphertext = (to_blocks(plaintext, len(k), True) @ k)%26
+    return match_input(ciphertext.ravel(), plaintext)
+
+def hill_decrypt(ciphertext: list[int]|np.ndarray, key: list[list[int]]) -> list[int]|np.ndarray:
+    """
+    performs a hill decryption by plaintext = y@key^(-1), every block at once
+
+    Arguments
+    ---------
+    ciphertext: the message, a multiple of the key size long
     key: the linear transformation key
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
+    """
+    _, k_inv = hill_key_arrays(key)
+    plaintext = (to_blocks(ciphertext, len(k_inv), False) @ k_inv)%26
+    return match_input(plaintext.ravel(), ciphertext)
+
+def _singular(blocks: list[list[int]]) -> bool:
+    """
+    whether the blocks leave some key undetermined, that is they do not span every length m vector mod 2 or mod 13
+
+    Arguments
+    ---------
+    blocks: the plaintext blocks, at least m of them
+
+    Returns
+    -------
+    true if x@key = y has more than one solution whenever it has one
     """
-    m = len(key)
-    k_inv = inv(key)
-    plaintext = []
-    for i in range(0, len(ciphertext), m):
-        p = mult([ciphertext[i:i+m]], k_inv)
-        plaintext += p[0]
-    return plaintext
+    # blocks@x = blocks always has the identity as a solution, so it is unique exactly when the blocks have full rank
+    try:
+        solve(blocks, blocks)
+    except ValueError:
+        return True
+    return False
 
-def hill_decrypt_known_plaintext(plaintext: list[int], ciphertext: list[int]) -> list[list[int]]:
+def hill_decrypt_known_plaintext(plaintext: list[int], ciphertext: list[int], max_m: int = 10) -> list[list[int]]:
     """
-    determines the key to a known plaintext hill cipher.
+    determines the key to a known plaintext hill cipher. For each key size, smallest first, and each offset of the block boundary into the crib, the whole block pairs are stacked into the overdetermined system x@key = y mod 26, solved by elimination and checked against every pair, so a crib with some singular blocks or taken from the middle of a message still works
 
     Arguments
     ---------
     plaintext: duh
-    ciphertext: duh
+    ciphertext: duh, aligned letter for letter with the plaintext
+    max_m: the largest key size tried
 
     Returns
     -------
-    the key, a matrix
+    the key, a matrix, or [[0]] if no key fits
     """
-    # get all potential key lengths
-    ms = []
-    for i in range(2, int(sqrt(len(plaintext))) + 1):
-        if len(plaintext)%i == 0:
-            ms.append(i)
+    plaintext, ciphertext = list(plaintext), list(ciphertext)
+    n = min(len(plaintext), len(ciphertext))
+    # any invertible set of exactly m blocks fits some key, so keys checked by spare blocks are preferred over those that are not
+    for overdetermined in (True, False):
+        for m in range(2, max_m + 1):
+            for offset in range(m):
+                blocks = (n - offset)//m
+                if blocks < m or (blocks > m) != overdetermined:
+                    continue
+                x = to_blocks(plaintext[offset:offset + blocks*m], m, False)
+                y = to_blocks(ciphertext[offset:offset + blocks*m], m, False)
+                # a few spare blocks nearly always pin the key down, the rest are only checked against it
+                x_head, y_head = x[:8*m].tolist(), y[:8*m].tolist()
+                try:
+                    key = solve(x_head, y_head)
+                except ValueError:
+                    # no key fits the whole crib if none fits these blocks, but degenerate ones, say a run of one letter, need the rest
+                    if len(x) <= 8*m or not _singular(x_head):
+                        continue
+                    try:
+                        key = solve(x.tolist(), y.tolist())
+                    except ValueError:
+                        continue
+                if gcd(det(key), 26) == 1 and ((x @ np.array(key))%26 == y%26).all():
+                    return key
+    return [[0]]
 
-    key = [[0]]
-    solved = False
-    for m in ms:
-        # make the plaintext matrix
-        x = [plaintext[i*m:(i+1)*m] for i in range(m)]
+def all_columns(m: int) -> np.ndarray:
+    """
+    every length m vector mod 26, in base 26 order
 
-        # check if invertible
-        # NOTE: if not invertible, will have to build the x matrix from other parts
-        det_x = det(x)
+    Arguments
+    ---------
+    m: the length
 
-        if det_x != 0 and gcd(det_x, 26) == 1:
-            # make the ciphertext matrix
-            y = [ciphertext[i*m:(i+1)*m] for i in range(m)]
+    Returns
+    -------
+    a uint8 array of shape (26^m, m)
+    """
+    return np.indices((26,)*m, dtype=np.uint8).reshape(m, -1).T
 
-            x_inv = inv(x)
+def column_decryptions(ciphertext: list[int]|np.ndarray, columns: np.ndarray) -> np.ndarray:
+    """
+    the plaintext letters each candidate column of the inverse key gives. Column j of key^(-1) decides every letter at position j mod m on its own
 
-            key = mult(x_inv, y)
+    Arguments
+    ---------
+    ciphertext: the message, a multiple of m long
+    columns: the candidate columns, shape (k, m)
 
-            # check if we can encrypt the plaintext into the given ciphertext
-            if hill_encrypt(plaintext, key) == ciphertext:
-                solved = True
-                break
-    if solved:
-            return key
+    Returns
+    -------
+    a uint8 array of shape (k, n/m), row i is the letters column i gives
+    """
+    blocks = to_blocks(ciphertext, columns.shape[1], False)
+    return ((columns.astype(np.int64) @ blocks.T)%26).astype(np.uint8)
+
+def hill_decrypt_ciphertext_only(ciphertext: list[int]|np.ndarray, top: int = 10, sample_len: int = 200, table: np.ndarray|None = None) -> list[tuple[list[list[int]], float]]:
+    """
+    finds a 2x2 hill key from the ciphertext alone. Every invertible inverse key is tried on a sample of the ciphertext and scored with n-gram fitness in batches, then the best are rescored on the whole message
+
+    Arguments
+    ---------
+    ciphertext: the message, an even length
+    top: the number of keys to return
+    sample_len: the number of letters each key is screened on
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+
+    Returns
+    -------
+    the best keys with their scores, from best to worst
+    """
+    if table is None:
+        table = get_ngram_table()
+    ciphertext = to_array(ciphertext)
+    sample = ciphertext[:min(len(ciphertext), max(sample_len, 4))//2*2]
+    columns = all_columns(2)
+    decryptions = column_decryptions(sample, columns)
+
+    # the pairs of columns that make an invertible inverse key
+    first, second = np.divmod(np.arange(len(columns)**2), len(columns))
+    a, b = columns[first].astype(np.int64).T, columns[second].astype(np.int64).T
+    keep = np.gcd((a[0]*b[1] - a[1]*b[0])%26, 26) == 1
+    first, second = first[keep], second[keep]
+
+    scores = np.empty(len(first))
+    texts = np.empty((1 << 14, len(sample)), dtype=np.uint8)
+    for i in range(0, len(first), len(texts)):
+        chunk = slice(i, i + len(texts))
+        n = len(first[chunk])
+        texts[:n, 0::2] = decryptions[first[chunk]]
+        texts[:n, 1::2] = decryptions[second[chunk]]
+        scores[chunk] = ngram_score(texts[:n], table)
+
+    best = np.argsort(-scores, kind='stable')[:top]
+    k_invs = np.stack((columns[first[best]], columns[second[best]]), axis=2).astype(np.int64)
+    order, scores = rank_candidates(np.array([hill_decrypt(ciphertext, inv(k_inv.tolist())) for k_inv in k_invs]), table)
+    return [(inv(k_invs[i].tolist()), float(s)) for i, s in zip(order, scores)]
+
+def _score_columns(span: tuple[int, int], search: tuple[np.ndarray, np.ndarray, int]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    scores a range of the candidate inverse key columns by the monogram log likelihood of the letters they give
+
+    Arguments
+    ---------
+    span: the first and one past the last column, in base 26 order
+    search: the ciphertext blocks, the log letter probabilities and the number of columns to keep
+
+    Returns
+    -------
+    the kept columns (as base 26 numbers) and their scores
+    """
+    blocks, log_probs, keep = search
+    m = blocks.shape[1]
+    numbers = np.arange(*span)
+    columns = numbers[:, None]//26**np.arange(m - 1, -1, -1)%26
+    # float32 products are exact at these sizes and go through blas, unlike integer ones
+    letters = (columns.astype(np.float32) @ blocks.T.astype(np.float32)).astype(np.int32)%26
+    scores = log_probs[letters].sum(axis=1, dtype=np.float64)
+    # a column that is all even or all multiples of 13 cannot be part of an invertible key
+    scores[(columns%2 == 0).all(axis=1) | (columns%13 == 0).all(axis=1)] = -np.inf
+    best = np.argpartition(-scores, keep - 1)[:keep] if len(scores) > keep else np.arange(len(scores))
+    return numbers[best], scores[best]
+
+def best_columns(blocks: np.ndarray, log_probs: np.ndarray, keep: int, workers: int = 1) -> np.ndarray:
+    """
+    scores all 26^m candidate inverse key columns by the log likelihood of the letters they give from the blocks
+
+    Arguments
+    ---------
+    blocks: the (n x m) blocks the columns are applied to
+    log_probs: the log probability of each of the 26 letters
+    keep: the number of columns to keep
+    workers: the number of processes to score the columns with, see parallel.parallel_map
+
+    Returns
+    -------
+    the kept columns from best to worst, a uint8 array of shape (keep, m)
+    """
+    m = blocks.shape[1]
+    search = (blocks, log_probs, keep)
+    step = max(1, (1 << 22)//len(blocks))
+    spans = [(i, min(i + step, 26**m)) for i in range(0, 26**m, step)]
+    if workers > 1:
+        kept = parallel_map(_score_columns, spans, search, workers)
     else:
-        return [[0]]
+        kept = [_score_columns(span, search) for span in spans]
+    numbers = np.concatenate([k[0] for k in kept])
+    scores = np.concatenate([k[1] for k in kept])
+    numbers = numbers[np.argsort(-scores, kind='stable')[:keep]]
+    return (numbers[:, None]//26**np.arange(m - 1, -1, -1)%26).astype(np.uint8)
+
+def best_column_orders(columns: np.ndarray, decryptions: np.ndarray, top: int, table: np.ndarray) -> np.ndarray:
+    """
+    puts candidate columns together in every order, keeps the invertible inverse keys and scores the letters they give with n-gram fitness
+
+    Arguments
+    ---------
+    columns: the candidate columns, shape (k, m)
+    decryptions: the letters each column gives, shape (k, n/m), see column_decryptions
+    top: the number of keys to keep
+    table: the n-gram table to score with
+
+    Returns
+    -------
+    the column order of each kept key from best to worst, an array of shape (top, m). Key i is columns[orders[i]].T
+    """
+    m = columns.shape[1]
+    orders = np.array(list(permutations(range(len(columns)), m)), dtype=np.int64).reshape(-1, m)
+    k_invs = np.swapaxes(columns[orders], 1, 2).astype(np.int64)
+    dets = np.rint(np.linalg.det(k_invs)).astype(np.int64)%26
+    orders = orders[np.gcd(dets, 26) == 1]
+
+    length = decryptions.shape[1]*m
+    scores = np.empty(len(orders))
+    texts = np.empty((max(1, (1 << 22)//max(length, 1)), length), dtype=np.uint8)
+    for i in range(0, len(orders), len(texts)):
+        chunk = orders[i:i + len(texts)]
+        for j in range(m):
+            texts[:len(chunk), j::m] = decryptions[chunk[:, j]]
+        scores[i:i + len(chunk)] = ngram_score(texts[:len(chunk)], table)
+    return orders[np.argsort(-scores, kind='stable')[:top]]
+
+def hill_decrypt_columnwise(ciphertext: list[int]|np.ndarray, m: int, top: int = 10, candidates: int = 16, sample_len: int = 600, table: np.ndarray|None = None, workers: int = 1) -> list[tuple[list[list[int]], float]]:
+    """
+    finds an m x m hill key from the ciphertext alone, for m where trying every key is out of reach. Column j of key^(-1) gives every letter at position j mod m by itself, so all 26^m columns are scored on their own by monogram log likelihood. The best are put together in every order, the invertible keys are scored with n-gram fitness on a sample, and the best of those are rescored on the whole message
+
+    Arguments
+    ---------
+    ciphertext: the message, a multiple of m long
+    m: the key size, up to about 5
+    top: the number of keys to return
+    candidates: the number of columns kept for putting keys together, candidates!/(candidates - m)! keys are tried
+    sample_len: the number of letters the columns and keys are scored on
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+    workers: the number of processes to score the columns with, see parallel.parallel_map
+
+    Returns
+    -------
+    the best keys with their scores, from best to worst
+    """
+    if table is None:
+        table = get_ngram_table()
+    ciphertext = to_array(ciphertext)
+    sample = ciphertext[:min(len(ciphertext), sample_len)//m*m]
+    log_probs = np.log(np.array(get_normal_letter_probabilities(), dtype=np.float32))
+    columns = best_columns(to_blocks(sample, m, False), log_probs, candidates, workers)
+    orders = best_column_orders(columns, column_decryptions(sample, columns), top, table)
+    if len(orders) == 0:
+        return []
+
+    keys = [inv(columns[order].T.tolist()) for order in orders]
+    order, scores = rank_candidates(np.array([hill_decrypt(ciphertext, key) for key in keys]), table)
+    return [(keys[i], float(s)) for i, s in zip(order, scores)]
 
 def hill_decrypt_common_patterns(ciphertext: list[int]) -> tuple[list[int], list[list[int]]]:
     """
@@ -176,8 +426,23 @@ if __name__ == '__main__':
     assert undigitize(hill_encrypt(dplaintext, k), 'cipher') == ciphertext
     assert undigitize(hill_decrypt(dciphertext, k), 'plain') == plaintext
 
+    # a crib that starts part way into a block
+    plaintext = 'itwasthebestoftimesitwastheworstoftimesitwastheageofwisdom'
+    dplaintext = digitize(plaintext)
+    k = [[10, 5, 12], [3, 14, 21], [8, 9, 11]]
+    dciphertext = hill_encrypt(dplaintext, k)
+    assert hill_decrypt_known_plaintext(dplaintext[4:], dciphertext[4:len(dplaintext)]) == k
+
+    # a run of one letter gives singular blocks all through the first few
+    dplaintext = digitize('aaa'*30 + plaintext)
+    dciphertext = hill_encrypt(dplaintext, k)
+    assert hill_decrypt_known_plaintext(dplaintext, dciphertext[:len(dplaintext)]) == k
+
     ciphertext = 'LMQETXYEAGTXCTUIEWNCTXLZEWUAISPZYVAPEWLMGQWYAXFTCJMSQCADAGTXLMDXNXSNPJQSYVAPRIQSMHNOCVAXFV'
     dciphertext = digitize(ciphertext)
+    k, _ = hill_decrypt_ciphertext_only(dciphertext)[0]
+    assert undigitize(hill_decrypt(dciphertext, k), 'plain').startswith('thekingwasinhiscountinghouse')
+
     dplaintext, k = hill_decrypt_common_patterns(dciphertext)
     plaintext = undigitize(dplaintext, 'plain')
     print(plaintext)
@@ -1,9 +1,122 @@
 from math import gcd
 
 
+def _crt(r_2: int, r_13: int) -> int:
+    """
+    combines residues mod 2 and mod 13 into the residue mod 26
+
+    Arguments
+    ---------
+    r_2: the residue mod 2
+    r_13: the residue mod 13
+
+    Returns
+    -------
+    x mod 26 with x = r_2 mod 2 and x = r_13 mod 13
+    """
+    return (r_13 + 13*((r_2 - r_13)%2))%26
+
+def _row_reduce(m: list[list[int]], p: int) -> tuple[list[list[int]], list[int], int]:
+    """
+    gauss-jordan elimination mod a prime
+
+    Arguments
+    ---------
+    m: the matrix
+    p: the prime
+
+    Returns
+    -------
+    the reduced row echelon form, the pivot column of each non-zero row, and the determinant factor (the product of the pivots and row swap signs, only meaningful for square matrices)
+    """
+    a = [[x%p for x in row] for row in m]
+    rows = len(a)
+    cols = len(a[0]) if rows else 0
+    pivots = []
+    factor = 1
+    r = 0
+    for c in range(cols):
+        pivot = next((i for i in range(r, rows) if a[i][c]), None)
+        if pivot is None:
+            continue
+        if pivot != r:
+            a[r], a[pivot] = a[pivot], a[r]
+            factor = -factor
+        factor = factor*a[r][c]%p
+        pivot_inv = pow(a[r][c], -1, p)
+        a[r] = [x*pivot_inv%p for x in a[r]]
+        for i in range(rows):
+            if i != r and a[i][c]:
+                scale = a[i][c]
+                row_r = a[r]
+                a[i] = [(x - scale*y)%p for x, y in zip(a[i], row_r)]
+        pivots.append(c)
+        r += 1
+        if r == rows:
+            break
+    return a, pivots, factor%p
+
+def _det_mod(m: list[list[int]], p: int) -> int:
+    """
+    the determinant mod a prime by elimination
+
+    Arguments
+    ---------
+    m: the square matrix
+    p: the prime
+
+    Returns
+    -------
+    the determinant mod p
+    """
+    _, pivots, factor = _row_reduce(m, p)
+    return factor if len(pivots) == len(m) else 0
+
+def _inv_mod(m: list[list[int]], p: int) -> list[list[int]]|None:
+    """
+    the inverse mod a prime by gauss-jordan elimination of [m | I]
+
+    Arguments
+    ---------
+    m: the square matrix
+    p: the prime
+
+    Returns
+    -------
+    the inverse mod p or None if m is singular mod p
+    """
+    n = len(m)
+    augmented = [list(row) + [int(i == j) for j in range(n)] for i, row in enumerate(m)]
+    a, pivots, _ = _row_reduce(augmented, p)
+    if pivots[:n] != list(range(n)):
+        return None
+    return [row[n:] for row in a]
+
+def _solve_mod(a: list[list[int]], b: list[list[int]], p: int) -> list[list[int]]|None:
+    """
+    solves a@x = b mod a prime by elimination of [a | b]
+
+    Arguments
+    ---------
+    a: the (r x n) coefficients
+    b: the (r x k) right hand sides
+    p: the prime
+
+    Returns
+    -------
+    the unique (n x k) solution or None if there is none or more than one
+    """
+    n = len(a[0])
+    augmented = [list(row_a) + list(row_b) for row_a, row_b in zip(a, b)]
+    reduced, pivots, _ = _row_reduce(augmented, p)
+    # a pivot in the b columns means an inconsistent row, a missing pivot in the a columns a free variable
+    if pivots[:n] != list(range(n)) or len(pivots) > n:
+        return None
+    return [row[n:] for row in reduced[:n]]
+
 def det(m: list[list[int]]) -> int:
     """
-    calculates the determinant of a matrix mod 26
+    calculates the determinant of a matrix mod 26 by elimination mod 2 and mod 13, combined by the chinese remainder theorem
 
     Arguments
     ---------
@@ -19,17 +132,11 @@ def det(m: list[list[int]]) -> int:
     if n == 2:
         return (m[0][0] * m[1][1] - m[0][1] * m[1][0]) % 26
 
-    determinant = 0
-    for c in range(n):
-        submatrix = [row[:c] + row[c+1:] for row in m[1:]]
-        sign = (-1) ** c
-        determinant += sign * m[0][c] * det(submatrix)
-
-    return determinant % 26
+    return _crt(_det_mod(m, 2), _det_mod(m, 13))
 
 def adjoint(m: list[list[int]]) -> list[list[int]]:
     """
-    calculates the adjoint of a matrix mod 26
+    calculates the adjoint of a matrix mod 26. Mod each prime it is det*inv when m is invertible there and the cofactors otherwise
 
     Arguments
     ---------
@@ -43,18 +150,25 @@ def adjoint(m: list[list[int]]) -> list[list[int]]:
     if n == 1:
         return [[1]]
 
-    adj = [[0] * n for _ in range(n)]
-    for i in range(n):
-        for j in range(n):
-            submatrix = [row[:j] + row[j+1:] for k, row in enumerate(m) if k != i]
-            sign = (-1) ** (i + j)
-            adj[j][i] = (sign * det(submatrix)) % 26
-
-    return adj
+    adjs = []
+    for p in (2, 13):
+        m_inv = _inv_mod(m, p)
+        if m_inv is not None:
+            det_m = _det_mod(m, p)
+            adjs.append([[det_m*x%p for x in row] for row in m_inv])
+            continue
+        adj = [[0] * n for _ in range(n)]
+        for i in range(n):
+            for j in range(n):
+                submatrix = [row[:j] + row[j+1:] for k, row in enumerate(m) if k != i]
+                sign = (-1) ** (i + j)
+                adj[j][i] = (sign * _det_mod(submatrix, p)) % p
+        adjs.append(adj)
+    return [[_crt(x_2, x_13) for x_2, x_13 in zip(row_2, row_13)] for row_2, row_13 in zip(*adjs)]
 
 def inv(m: list[list[int]]) -> list[list[int]]:
     """
-    calculates the invers of the matrix mod 26
+    calculates the invers of the matrix mod 26 by gauss-jordan elimination mod 2 and mod 13, combined by the chinese remainder theorem
 
     Arguments
     ---------
@@ -64,24 +178,46 @@ def inv(m: list[list[int]]) -> list[list[int]]:
     -------
     the inverse
     """
-    # test if invertible
-    det_m = det(m)
-    if det_m == 0 or gcd(det_m, 26) != 1:
-        raise ValueError("m is non-invertible")
-
     n = len(m)
-    if n == 1:
-        return [[pow(m[0][0], -1, 26)]]
-
-    det_inv = pow(det_m, -1, 26)
-    if n == 2:
+    if n <= 2:
+        # test if invertible
+        det_m = det(m)
+        if det_m == 0 or gcd(det_m, 26) != 1:
+            raise ValueError("m is non-invertible")
+        if n == 1:
+            return [[pow(m[0][0], -1, 26)]]
+        det_inv = pow(det_m, -1, 26)
         return [
             [(m[1][1]*det_inv)%26, (-m[0][1]*det_inv)%26],
             [(-m[1][0]*det_inv)%26, (m[0][0]*det_inv)%26]
         ]
 
-    m_adj = adjoint(m)
-    return [[(num*det_inv)%26 for num in m_adj[i]] for i in range(len(m_adj))]
+    inv_2 = _inv_mod(m, 2)
+    inv_13 = _inv_mod(m, 13)
+    if inv_2 is None or inv_13 is None:
+        raise ValueError("m is non-invertible")
+    return [[_crt(x_2, x_13) for x_2, x_13 in zip(row_2, row_13)] for row_2, row_13 in zip(inv_2, inv_13)]
+
+def solve(a: list[list[int]], b: list[list[int]]) -> list[list[int]]:
+    """
+    solves a@x = b mod 26 by elimination mod 2 and mod 13, combined by the chinese remainder theorem. a may have more rows than columns as long as the solution is unique
+
+    Arguments
+    ---------
+    a: the (r x n) coefficients
+    b: the (r x k) right hand sides
+
+    Returns
+    -------
+    the (n x k) solution
+    """
+    if len(a) != len(b):
+        raise ValueError("Incompatible matrix dimensions for solving")
+    x_2 = _solve_mod(a, b, 2)
+    x_13 = _solve_mod(a, b, 13)
+    if x_2 is None or x_13 is None:
+        raise ValueError("the system has no unique solution mod 26")
+    return [[_crt(u, v) for u, v in zip(row_2, row_13)] for row_2, row_13 in zip(x_2, x_13)]
 
 def mult(m_1: list[list[int]], m_2: list[list[int]]) -> list[list[int]]:
     """
@@ -177,3 +313,5 @@ if __name__ == '__main__':
     assert sub(m_1, m_2) == [[4, 16], [6, 22]]
 
     assert add(m_1, m_2) == [[18, 0], [0, 18]]
+
+    assert mult(k, solve(k, [[1], [2], [3]])) == [[1], [2], [3]]
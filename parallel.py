@@ -0,0 +1,146 @@
+import multiprocessing as mp
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice, repeat
+from typing import Any, Callable, Iterable, Iterator
+
+
+# set in every worker by _init_worker. With the fork start method they are inherited, not pickled
+_shared: Any = None
+_stop: Any = None
+
+def _init_worker(shared: Any, stop: Any) -> None:
+    """
+    stores the search state in the worker process
+
+    Arguments
+    ---------
+    shared: the read only data every attempt needs, e.g. the dictionary
+    stop: the event set once any worker has found a result
+    """
+    global _shared, _stop
+    _shared, _stop = shared, stop
+
+def _attempt_chunk(attempt: Callable[[Any, Any], Any], keys: list) -> Any:
+    """
+    tries the keys of one chunk in order until one works or another worker has already succeeded
+
+    Arguments
+    ---------
+    attempt: called as attempt(key, shared), returns the result or None
+    keys: the chunk of keys
+
+    Returns
+    -------
+    the first result or None
+    """
+    for key in keys:
+        if _stop.is_set():
+            return None
+        result = attempt(key, _shared)
+        if result is not None:
+            _stop.set()
+            return result
+    return None
+
+def _map_chunk(function: Callable[[Any, Any], Any], items: list) -> list:
+    """
+    applies the function to every item of one chunk
+
+    Arguments
+    ---------
+    function: called as function(item, shared)
+    items: the chunk of items
+
+    Returns
+    -------
+    the results in the order of the items
+    """
+    return [function(item, _shared) for item in items]
+
+def _chunks(keys: Iterable, chunk_size: int) -> Iterator[list]:
+    """
+    splits the keys into lists of chunk_size
+
+    Arguments
+    ---------
+    keys: the key space
+    chunk_size: the size of each list
+
+    Returns
+    -------
+    the lists
+    """
+    it = iter(keys)
+    while chunk := list(islice(it, chunk_size)):
+        yield chunk
+
+def get_context() -> mp.context.BaseContext:
+    """
+    the multiprocessing context the searches use: fork where available, so the shared data is inherited copy on write instead of pickled
+
+    Returns
+    -------
+    the context
+    """
+    return mp.get_context('fork') if 'fork' in mp.get_all_start_methods() else mp.get_context()
+
+def parallel_search(attempt: Callable[[Any, Any], Any], keys: Iterable, shared: Any = None, workers: int|None = None, chunk_size: int = 1) -> Any:
+    """
+    splits a key space across a process pool and returns as soon as any worker finds a result. Workers stop at their next key once a result is found and chunks not yet started are cancelled. The result is the first one found, which need not be the first in key order
+
+    Arguments
+    ---------
+    attempt: a module level function called as attempt(key, shared), returning the result or None
+    keys: the key space
+    shared: read only data for attempt, handed to each worker once rather than with every task
+    workers: the number of processes, os.cpu_count() if not given
+    chunk_size: the number of keys sent to a worker at a time
+
+    Returns
+    -------
+    the result or None if no key works
+    """
+    workers = workers or os.cpu_count() or 1
+    context = get_context()
+    stop = context.Event()
+    chunks = _chunks(keys, chunk_size)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(shared, stop)) as executor:
+        # keep a bounded number of chunks in flight so huge key spaces are not materialized
+        pending: set[Future] = set()
+        for chunk in islice(chunks, 2*workers):
+            pending.add(executor.submit(_attempt_chunk, attempt, chunk))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result is not None:
+                    stop.set()
+                    for other in pending:
+                        other.cancel()
+                    return result
+            for chunk in islice(chunks, len(done)):
+                pending.add(executor.submit(_attempt_chunk, attempt, chunk))
+    return None
+
+def parallel_map(function: Callable[[Any, Any], Any], items: Iterable, shared: Any = None, workers: int|None = None, chunk_size: int = 1) -> list:
+    """
+    applies a function to every item across a process pool, for work that has to finish every item such as scoring a whole key space
+
+    Arguments
+    ---------
+    function: a module level function called as function(item, shared)
+    items: the work items
+    shared: read only data for function, handed to each worker once rather than with every task
+    workers: the number of processes, os.cpu_count() if not given
+    chunk_size: the number of items sent to a worker at a time
+
+    Returns
+    -------
+    the results in the order of the items
+    """
+    workers = workers or os.cpu_count() or 1
+    context = get_context()
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(shared, None)) as executor:
+        chunks = executor.map(_map_chunk, repeat(function), _chunks(items, chunk_size))
+        return [result for chunk in chunks for result in chunk]
@@ -1,7 +1,172 @@
+from functools import lru_cache
 from utils import get_dictionary
-from ciphertext import is_valid
+from ciphertext import digitize_array, is_valid
+from fitness import get_ngram_table, ngram_score
+from parallel import parallel_search
+import numpy as np
 
 
+def _gather(message: list, index: np.ndarray) -> list:
+    """
+    reorders a message by a gather index in one np.take, going through bytes when the message is single ascii characters
+
+    Arguments
+    ---------
+    message: the characters, or any other items
+    index: position i of the result is message[index[i]]
+
+    Returns
+    -------
+    the reordered items
+    """
+    # the join only works on strs, and once there is no empty one the lengths only agree if every item is one character
+    try:
+        text = ''.join(message)
+    except TypeError:
+        text = None
+    if text is not None and len(text) == len(message) and text.isascii() and (isinstance(message, str) or '' not in message):
+        return list(np.frombuffer(text.encode('ascii'), dtype=np.uint8).take(index).tobytes().decode('ascii'))
+    return [message[i] for i in index.tolist()]
+
+def _read_only(index: np.ndarray) -> np.ndarray:
+    """
+    marks a cached index read only so callers cannot change it for everyone
+
+    Arguments
+    ---------
+    index: the index
+
+    Returns
+    -------
+    the same index
+    """
+    index.flags.writeable = False
+    return index
+
+def _expand(pattern: np.ndarray, length: int) -> np.ndarray:
+    """
+    repeats the gather index of one block over a whole message
+
+    Arguments
+    ---------
+    pattern: the gather index of one block
+    length: the message length, a multiple of len(pattern)
+
+    Returns
+    -------
+    the gather index of the message
+    """
+    return (np.arange(0, length, len(pattern), dtype=np.intp)[:, None] + pattern).ravel()
+
+@lru_cache(maxsize=256)
+def _block_pattern(key: tuple[int, ...], inverse: bool) -> np.ndarray:
+    """
+    the gather index of one block of permute_encrypt, compiled once per key
+
+    Arguments
+    ---------
+    key: the block permutation
+    inverse: whether to give the index of permute_decrypt instead
+
+    Returns
+    -------
+    the read only index of one block
+    """
+    pattern = np.array(key, dtype=np.intp)
+    return _read_only(np.argsort(pattern) if inverse else pattern)
+
+def permute_index(key: tuple[int, ...], length: int, inverse: bool = False) -> np.ndarray:
+    """
+    the gather index of permute_encrypt over a whole message, only the block pattern is cached so memory does not grow with the message
+
+    Arguments
+    ---------
+    key: the block permutation
+    length: the message length, a multiple of len(key)
+    inverse: whether to give the index of permute_decrypt instead
+
+    Returns
+    -------
+    the index, see _gather
+    """
+    return _expand(_block_pattern(tuple(key), inverse), length)
+
+def _mod_class_sources(key: int, length: int, count: int) -> np.ndarray:
+    """
+    where the first count letters of permute_mod_class_decrypt come from in the ciphertext
+
+    Arguments
+    ---------
+    key: the number of classes
+    length: the message length
+    count: the number of plaintext positions
+
+    Returns
+    -------
+    the gather index of the first count letters, see _gather
+    """
+    size, larger = divmod(length, key)
+    positions = np.arange(count, dtype=np.intp)
+    classes = positions%key
+    # position i is letter i//key of its class, after the earlier classes of size letters each and one more for each of the first larger
+    return classes*size + np.minimum(classes, larger) + positions//key
+
+def mod_class_index(key: int, length: int, inverse: bool = False) -> np.ndarray:
+    """
+    the gather index of permute_mod_class_encrypt, the positions sorted by their class mod key
+
+    Arguments
+    ---------
+    key: the number of classes
+    length: the message length
+    inverse: whether to give the index of permute_mod_class_decrypt instead
+
+    Returns
+    -------
+    the index, see _gather
+    """
+    sources = _mod_class_sources(key, length, length)
+    if inverse:
+        return sources
+    index = np.empty_like(sources)
+    index[sources] = np.arange(length, dtype=np.intp)
+    return index
+
+@lru_cache(maxsize=256)
+def _box_pattern(m: int, n: int, inverse: bool) -> np.ndarray:
+    """
+    the gather index of one whole box of permute_box_encryption, compiled once per box size
+
+    Arguments
+    ---------
+    m: the number of rows
+    n: the number of columns
+    inverse: whether to give the index of permute_box_decryption instead
+
+    Returns
+    -------
+    the read only index of one box
+    """
+    return _read_only(mod_class_index(n, m*n, inverse))
+
+def box_index(m: int, n: int, length: int, inverse: bool = False) -> np.ndarray:
+    """
+    the gather index of permute_box_encryption, a mod class index per box of m*n letters
+
+    Arguments
+    ---------
+    m: the number of rows
+    n: the number of columns
+    length: the message length
+    inverse: whether to give the index of permute_box_decryption instead
+
+    Returns
+    -------
+    the index, see _gather
+    """
+    full = length - length%(m*n)
+    return np.concatenate((_expand(_box_pattern(m, n, inverse), full), full + mod_class_index(n, length - full, inverse)))
+
 def permute_encrypt(plaintext: list[str], key: list[int]) -> list[str]:
     """
     encryptes the text by permuting every m=len(key) characters according to the key. The key indexes from 0.
@@ -19,13 +184,8 @@ def permute_encrypt(plaintext: list[str], key: list[int]) -> list[str]:
     # pad the edge
     edge = len(plaintext)%m
     if edge != 0:
-        ciphertext = plaintext + ['a']*(m - edge)
-    else:
-        ciphertext = plaintext.copy()
-
-    for i in range(0, len(ciphertext), m):
-        ciphertext[i:i+m] = [ciphertext[i:i+m][k] for k in key]
-    return ciphertext
+        plaintext = plaintext + ['a']*(m - edge)
+    return _gather(plaintext, permute_index(tuple(key), len(plaintext)))
 
 def permute_decrypt(ciphertext: list[str], key: list[int]) -> list[str]:
     """
@@ -43,14 +203,7 @@ def permute_decrypt(ciphertext: list[str], key: list[int]) -> list[str]:
     m = len(key)
     if len(ciphertext)%m != 0:
         raise ValueError('the ciphertext was not encrypted with this key as there was not put padding on the ciphertext')
-
-    # find the inverse key
-    new_key = []
-    for i in range(m):
-        new_key.append(key.index(i))
-
-    plaintext = permute_encrypt(ciphertext, new_key)
-    return plaintext
+    return _gather(ciphertext, permute_index(tuple(key), len(ciphertext), True))
 
 def permute_mod_class_encrypt(plaintext: list[str], key: int) -> list[str]:
     """
@@ -65,11 +218,7 @@ def permute_mod_class_encrypt(plaintext: list[str], key: int) -> list[str]:
     -------
     the ciphertext
     """
-    block = [[plaintext[i] for i in range(len(plaintext)) if i%key == n] for n in range(key)]
-    ciphertext = []
-    for text in block:
-        ciphertext.extend(text)
-    return ciphertext
+    return _gather(plaintext, mod_class_index(key, len(plaintext)))
 
 def permute_mod_class_decrypt(ciphertext: list[str], key: int) -> list[str]:
     """
@@ -84,29 +233,62 @@ def permute_mod_class_decrypt(ciphertext: list[str], key: int) -> list[str]:
     -------
     the plaintext
     """
-    key = len(ciphertext)//key
-    return permute_mod_class_encrypt(ciphertext, key)
+    return _gather(ciphertext, mod_class_index(key, len(ciphertext), True))
+
+def _try_mod_class_key(key: int, search: tuple) -> tuple[list[str], int]|None:
+    """
+    decrypts with one mod class key and checks the result, see permute_mod_class_decrypt_exhaustive
+
+    Arguments
+    ---------
+    key: the number of classes
+    search: the ciphertext, words, prefix_len and prefix_req_score
 
-def permute_mod_class_decrypt_exhaustive(ciphertext: list[str]) -> tuple[list[str], int]:
+    Returns
+    -------
+    the plaintext and the key or None if the plaintext is not valid
+    """
+    ciphertext, words, prefix_len, prefix_req_score = search
+    # reject most wrong keys on a prefix, decrypting only its letters, before decrypting the whole message
+    if len(ciphertext) > prefix_len:
+        prefix = ''.join([ciphertext[i] for i in _mod_class_sources(key, len(ciphertext), prefix_len).tolist()])
+        if not is_valid(prefix, words, prefix_req_score):
+            return None
+    # combine all chars in plaintext into a single str
+    plaintext = "".join(permute_mod_class_decrypt(ciphertext, key))
+    if is_valid(plaintext, words):
+        return list(plaintext), key
+    return None
+
+def permute_mod_class_decrypt_exhaustive(ciphertext: list[str], dictionary: tuple[frozenset[str], int]|None = None, prefix_len: int = 80, prefix_req_score: float = 0.2, workers: int = 1) -> tuple[list[str], int]:
     """
     decrypts a mod class permutation encryption by checking each mod class
 
     Arguments
     ---------
     ciphertext: the message
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
+    prefix_len: candidates longer than this are first decrypted and checked on this many letters only
+    prefix_req_score: the score per letter the prefix must reach before the whole candidate is decrypted and checked, see ciphertext.is_valid
+    workers: the number of processes to split the keys over, see parallel.parallel_search. With more than one the first valid key found is returned, not necessarily the smallest
 
     Returns
     -------
     the plaintext and the key
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
-
-    for key in range(2, len(ciphertext)):
-        plaintext = permute_mod_class_decrypt(ciphertext, key)
-        # combine all chars in plaintext into a single str
-        plaintext = "".join(plaintext)
-        if is_valid(plaintext, dictionary, max_word_len, 20):
-            return list(plaintext), key
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
+    search = (ciphertext, words, prefix_len, prefix_req_score)
+    keys = range(2, len(ciphertext))
+
+    if workers > 1:
+        result = parallel_search(_try_mod_class_key, keys, search, workers, chunk_size=max(1, len(keys)//(8*workers)))
+        return result if result is not None else ([""], 0)
+    for key in keys:
+        result = _try_mod_class_key(key, search)
+        if result is not None:
+            return result
     return [""], 0
 
 def permute_box_encryption(plaintext: list[str], m: int, n: int) -> list[str]:
@@ -123,10 +305,7 @@ def permute_box_encryption(plaintext: list[str], m: int, n: int) -> list[str]:
     -------
     the ciphertext
     """
-    ciphertext = []
-    for i in range(0, len(plaintext), m*n):
-        ciphertext.extend(permute_mod_class_encrypt(plaintext[i:i+m*n], n))
-    return ciphertext
+    return _gather(plaintext, box_index(m, n, len(plaintext)))
 
 def permute_box_decryption(ciphertext: list[str], m: int, n: int) -> list[str]:
     """
@@ -142,31 +321,221 @@ def permute_box_decryption(ciphertext: list[str], m: int, n: int) -> list[str]:
     -------
     the plaintext
     """
-    plaintext = []
-    for i in range(0, len(ciphertext), m*n):
-        plaintext.extend(permute_mod_class_decrypt(ciphertext[i:i+m*n], n))
-    return plaintext
+    return _gather(ciphertext, box_index(m, n, len(ciphertext), True))
 
-def permute_box_decryption_exhaustive(ciphertext: list[str]) -> tuple[list[str], int, int]:
+def _try_box_key(key: tuple[int, int], search: tuple) -> tuple[list[str], int, int]|None:
+    """
+    decrypts with one box size and checks the result, see permute_box_decryption_exhaustive
+
+    Arguments
+    ---------
+    key: the number of rows and columns
+    search: the ciphertext, words, prefix_len and prefix_req_score
+
+    Returns
+    -------
+    the plaintext, m, and n or None if the plaintext is not valid
+    """
+    ciphertext, words, prefix_len, prefix_req_score = search
+    i, j = key
+    # reject most wrong keys on the whole boxes covering a prefix before decrypting everything
+    box = i*j
+    prefix_boxes = -(-prefix_len//box)*box
+    if len(ciphertext) > prefix_boxes:
+        prefix = ''.join(permute_box_decryption(ciphertext[:prefix_boxes], i, j))
+        if not is_valid(prefix, words, prefix_req_score):
+            return None
+    plaintext = permute_box_decryption(ciphertext, i, j)
+    if is_valid(''.join(plaintext), words):
+        return plaintext, i, j
+    return None
+
+def permute_box_decryption_exhaustive(ciphertext: list[str], dictionary: tuple[frozenset[str], int]|None = None, prefix_len: int = 80, prefix_req_score: float = 0.2, workers: int = 1) -> tuple[list[str], int, int]:
     """
     decrypts a box permutation cipher by exhaustion
 
     Arguments
     ---------
     ciphertext: the message
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
+    prefix_len: candidates longer than this are first decrypted and checked on this many letters only
+    prefix_req_score: the score per letter the prefix must reach before the whole candidate is decrypted and checked, see ciphertext.is_valid
+    workers: the number of processes to split the keys over, see parallel.parallel_search. With more than one the first valid key found is returned, not necessarily the first in order
 
     Returns
     -------
     the plaintext, m, and n (the key)
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
-    for i in range(2, 11):
-        for j in range(2, 11):
-            plaintext = permute_box_decryption(ciphertext, i, j)
-            if is_valid(''.join(plaintext), dictionary, max_word_len, 20):
-                return plaintext, i, j
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
+    search = (ciphertext, words, prefix_len, prefix_req_score)
+    keys = [(i, j) for i in range(2, 11) for j in range(2, 11)]
+
+    if workers > 1:
+        result = parallel_search(_try_box_key, keys, search, workers)
+        return result if result is not None else ([''], 0, 0)
+    for key in keys:
+        result = _try_box_key(key, search)
+        if result is not None:
+            return result
     return [''], 0, 0
 
+def column_adjacency(ciphertext: list[str], m: int, table: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    scores how well each cipher column of a block permutation reads when put right before each other one
+
+    Arguments
+    ---------
+    ciphertext: the message, a multiple of m long
+    m: the block length
+    table: the digram table, see fitness.get_ngram_table
+
+    Returns
+    -------
+    a[i, j], the digram score of column i followed by column j in the same block, and b[i, j], column i of a block followed by column j of the next
+    """
+    blocks = digitize_array(''.join(ciphertext).lower()).reshape(-1, m).astype(np.intp)
+    a = table[blocks[:, :, None]*26 + blocks[:, None, :]].sum(axis=0, dtype=np.float64)
+    b = table[blocks[:-1, :, None]*26 + blocks[1:, None, :]].sum(axis=0, dtype=np.float64)
+    return a, b
+
+def _best_orders_exact(a: np.ndarray, b: np.ndarray) -> list[tuple[list[int], float]]:
+    """
+    finds the best order of the columns for every first and last column by dynamic programming over the sets of columns placed, 2^m m^3 steps in all
+
+    Arguments
+    ---------
+    a: the in block adjacency scores
+    b: the across block adjacency scores
+
+    Returns
+    -------
+    the orders with their scores, from best to worst
+    """
+    m = len(a)
+    full = (1 << m) - 1
+    # best[s, f, j] is the best score of a path through the set s starting at f and ending at j
+    best = np.full((1 << m, m, m), -np.inf)
+    parent = np.zeros((1 << m, m, m), dtype=np.int8)
+    for f in range(m):
+        best[1 << f, f, f] = 0
+    for s in range(1, full):
+        if not np.isfinite(best[s]).any():
+            continue
+        # extend every path through s by one more column k
+        extended = best[s][:, :, None] + a[None, :, :]
+        via = extended.argmax(axis=1)
+        score = np.take_along_axis(extended, via[:, None, :], axis=1)[:, 0, :]
+        ks = np.array([k for k in range(m) if not s >> k & 1])
+        targets = s | (1 << ks)
+        better = score[:, ks].T > best[targets, :, ks]
+        best[targets, :, ks] = np.where(better, score[:, ks].T, best[targets, :, ks])
+        parent[targets, :, ks] = np.where(better, via[:, ks].T, parent[targets, :, ks])
+
+    totals = best[full] + b.T
+    orders = []
+    for flat in np.argsort(-totals, axis=None, kind='stable'):
+        f, j = divmod(int(flat), m)
+        if not np.isfinite(totals[f, j]):
+            break
+        order, s = [j], full
+        while s != 1 << f:
+            previous = int(parent[s, f, j])
+            s ^= 1 << j
+            j = previous
+            order.append(j)
+        orders.append((order[::-1], float(totals[f, order[0]])))
+    return orders
+
+def _best_orders_anneal(a: np.ndarray, b: np.ndarray, steps: int, restarts: int, rng: np.random.Generator) -> list[tuple[list[int], float]]:
+    """
+    finds good orders of the columns by annealing with segment moves and swaps, for m too large for _best_orders_exact
+
+    Arguments
+    ---------
+    a: the in block adjacency scores
+    b: the across block adjacency scores
+    steps: the number of moves per restart
+    restarts: the number of restarts
+    rng: the random generator
+
+    Returns
+    -------
+    the best order of each restart with its score, from best to worst without repeats
+    """
+    m = len(a)
+
+    def path_score(order: list[int]) -> float:
+        return sum(a[order[i], order[i + 1]] for i in range(m - 1)) + b[order[-1], order[0]]
+
+    # start around the typical difference between two adjacencies and cool a hundredfold
+    t_start = float(np.std(a[~np.eye(m, dtype=bool)])) or 1.0
+    found = {}
+    for _ in range(restarts):
+        order = rng.permutation(m).tolist()
+        score = path_score(order)
+        best_order, best_score = order, score
+        for step in range(steps):
+            t = t_start*0.01**(step/steps)
+            i, j = sorted(rng.choice(m + 1, 2, replace=False).tolist())
+            if rng.random() < 0.7:
+                # move the columns i..j-1 elsewhere, keeping their order
+                segment, rest = order[i:j], order[:i] + order[j:]
+                k = int(rng.integers(0, len(rest) + 1))
+                candidate = rest[:k] + segment + rest[k:]
+            else:
+                j = min(j, m - 1)
+                candidate = order.copy()
+                candidate[i], candidate[j] = candidate[j], candidate[i]
+            candidate_score = path_score(candidate)
+            if candidate_score >= score or rng.random() < np.exp((candidate_score - score)/t):
+                order, score = candidate, candidate_score
+                if score > best_score:
+                    best_order, best_score = order, score
+        found[tuple(best_order)] = best_score
+    return sorted(((list(order), score) for order, score in found.items()), key=lambda x: -x[1])
+
+def permute_decrypt_ciphertext_only(ciphertext: list[str], m: int|None = None, top: int = 10, max_m: int = 20, max_exact: int = 12, steps: int = 5000, restarts: int = 10, seed: int = 0) -> list[tuple[list[int], float]]:
+    """
+    finds the key of a block permutation (see permute_encrypt) from the ciphertext alone. The digram score of every pair of cipher columns is counted once, then the order of the columns that reads best is found as a best path: exactly over all orders up to max_exact columns, by annealing past that. The best orders are decrypted and ranked by quadgram fitness
+
+    Arguments
+    ---------
+    ciphertext: the message
+    m: the block length, every divisor of the length from 2 to max_m is tried if not given
+    top: the number of keys to return
+    max_m: the largest block length tried when m is not given
+    max_exact: the largest block length searched exactly
+    steps: the number of annealing moves per restart past max_exact
+    restarts: the number of annealing restarts past max_exact
+    seed: the seed of the annealing
+
+    Returns
+    -------
+    the best keys with their scores, from best to worst
+    """
+    digrams = get_ngram_table(n=2)
+    quadgrams = get_ngram_table()
+    sizes = [m] if m is not None else [d for d in range(2, max_m + 1) if len(ciphertext)%d == 0]
+    rng = np.random.default_rng(seed)
+    ranked = []
+    for size in sizes:
+        if len(ciphertext)%size != 0:
+            raise ValueError('the ciphertext length is not a multiple of the block length')
+        a, b = column_adjacency(ciphertext, size, digrams)
+        if size <= max_exact:
+            orders = _best_orders_exact(a, b)[:top]
+        else:
+            orders = _best_orders_anneal(a, b, steps, restarts, rng)[:top]
+        for order, _ in orders:
+            key = [0]*size
+            for i, column in enumerate(order):
+                key[column] = i
+            plaintext = digitize_array(''.join(permute_decrypt(ciphertext, key)).lower())
+            ranked.append((key, float(ngram_score(plaintext, quadgrams)[0])))
+    ranked.sort(key=lambda x: -x[1])
+    return ranked[:top]
 
 if __name__ == '__main__':
     plaintext = list('cryptography')
@@ -176,6 +545,15 @@ if __name__ == '__main__':
     plaintext = permute_box_decryption(ciphertext, 3, 4)
     assert ''.join(plaintext) == 'cryptography'
 
+    assert permute_encrypt([1, 2, 3, 4], [1, 0]) == [2, 1, 4, 3]
+    assert permute_mod_class_encrypt([1, 2, 3, 4, 5], 2) == [1, 3, 5, 2, 4]
+    assert permute_mod_class_decrypt([1, 3, 5, 2, 4], 2) == [1, 2, 3, 4, 5]
+
+    plaintext = list('itwasthebestoftimesitwastheworstoftimesitwastheageofwisdomitwastheageoffoolishness')
+    ciphertext = permute_encrypt(plaintext, [3, 5, 0, 2, 4, 1, 6])
+    key, _ = permute_decrypt_ciphertext_only(ciphertext)[0]
+    assert key == [3, 5, 0, 2, 4, 1, 6]
+
     ciphertext = list('myamraruyiqtenctorahroywdsoyeouarrgdernogw')
     plaintext, m, n = permute_box_decryption_exhaustive(ciphertext)
     print(''.join(plaintext))
@@ -1,54 +1,114 @@
-from ciphertext import undigitize, is_valid
+import numpy as np
+from functools import lru_cache
+from ciphertext import apply_table, letter_table, undigitize, is_valid
+from fitness import get_ngram_table, rank_candidates
 from utils import get_dictionary
 
 
-def shift_encrypt(plaintext: list[int], key: int) -> list[int]:
+@lru_cache(maxsize=26)
+def shift_table(key: int) -> bytes:
+    """
+    the translate table of a shift, see ciphertext.letter_table
+
+    Arguments
+    ---------
+    key: the shift amount
+
+    Returns
+    -------
+    the table sending p to (p + key)%26
+    """
+    return letter_table([(p + key)%26 for p in range(26)])
+
+def shift_encrypt(plaintext: list[int]|np.ndarray, key: int) -> list[int]|np.ndarray:
     """
     performs a shift cipher encryption by c = (p + key)%26
 
     Arguments
     ---------
-    plaintext: the iterable of integers
+    plaintext: the list or array of integers
     key: the shift amount
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
-    return [(p + key)%26 for p in plaintext]
+    return apply_table(plaintext, shift_table(key%26))
 
-def shift_decrypt(ciphertext: list[int], key: int) -> list[int]:
+def shift_decrypt(ciphertext: list[int]|np.ndarray, key: int) -> list[int]|np.ndarray:
     """
     performs a shift cipher decryption by p = (c - key)%26
 
     Arguments
     ---------
-    ciphertext: the iterable of integers
+    ciphertext: the list or array of integers
     key: the de-shift amount
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
     plaintext = shift_encrypt(ciphertext, -key)
     return plaintext
 
-def shift_decrypt_exhaustive(ciphertext: list[int]) -> tuple[list[int], int]|None:
+def shift_decrypt_exhaustive(ciphertext: list[int], dictionary: tuple[frozenset[str], int]|None = None, prefix_len: int = 80, prefix_req_score: float = 0.2) -> tuple[list[int], int]|None:
     """
     decrypts the shift cipher by exhaustive search from key = 0 to 26
 
     Arguments
     ---------
     ciphertext: the code to break
-    is_valid: a test to determine if the deciphered code is valid
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
+    prefix_len: candidates longer than this are first decrypted and checked on this many letters only
+    prefix_req_score: the score per letter the prefix must reach before the whole candidate is decrypted and checked, see ciphertext.is_valid
 
     Returns
     -------
     the plaintext with the key or None if no solution found
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
     for key in range(26):
+        # reject most wrong keys on a prefix before paying for the whole message
+        if len(ciphertext) > prefix_len:
+            prefix = undigitize(shift_decrypt(ciphertext[:prefix_len], key), 'plain')
+            if not is_valid(prefix, words, prefix_req_score):
+                continue
         message = shift_decrypt(ciphertext, key)
         alpha_text = undigitize(message, 'plain')
-        if is_valid(alpha_text, dictionary, max_word_len, min_req_score=10):
+        if is_valid(alpha_text, words):
             return message, key
+
+def shift_decrypt_all_keys(ciphertext: list[int]) -> np.ndarray:
+    """
+    decrypts the ciphertext under all 26 keys at once
+
+    Arguments
+    ---------
+    ciphertext: the message
+
+    Returns
+    -------
+    a 26 x len(ciphertext) array whose row k is the plaintext for key k
+    """
+    c = np.asarray(ciphertext, dtype=np.int16)
+    return ((c[None, :] - np.arange(26, dtype=np.int16)[:, None])%26).astype(np.uint8)
+
+def shift_decrypt_ranked(ciphertext: list[int], table: np.ndarray|None = None) -> list[tuple[int, float]]:
+    """
+    scores the decryptions under every key with n-gram fitness in one batch
+
+    Arguments
+    ---------
+    ciphertext: the message
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+
+    Returns
+    -------
+    every key with its score, from best to worst
+    """
+    if table is None:
+        table = get_ngram_table()
+    order, scores = rank_candidates(shift_decrypt_all_keys(ciphertext), table)
+    return [(int(k), float(s)) for k, s in zip(order, scores)]
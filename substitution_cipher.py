@@ -1,11 +1,30 @@
-from ciphertext import is_valid
-from utils import get_common_digrams, get_common_letters, get_common_trigrams, get_dictionary, get_digram_counts, get_letter_counts, get_trigram_counts
+from ciphertext import is_valid, read, to_digits
+from functools import lru_cache
+from fitness import get_ngram_table
+from parallel import parallel_map
+from utils import get_common_digrams, get_common_letters, get_common_trigrams, get_dictionary, get_digram_counts, get_letter_counts, get_normal_letter_probabilities, get_trigram_counts
+import numpy as np
 import os
 
 
+@lru_cache(maxsize=256)
+def _translate_table(items: tuple[tuple[str, str], ...]) -> dict[int, str]:
+    """
+    compiles a key into a str.translate table, once per key
+
+    Arguments
+    ---------
+    items: the key's (from, to) pairs in the key's order, so when two share a from the later one wins as in a dict
+
+    Returns
+    -------
+    the table
+    """
+    return str.maketrans(dict(items))
+
 def sub_encrypt(plaintext: str, key: dict) -> str:
     """
-    performs a substitution cipher encryption by the obvious
+    performs a substitution cipher encryption by the obvious, as one str.translate with a table cached per key. Characters not in the key are left as they are
 
     Arguments
     ---------
@@ -16,8 +35,7 @@ def sub_encrypt(plaintext: str, key: dict) -> str:
     -------
     the ciphertext
     """
-    ciphertext = [key[t] for t in plaintext]
-    return ''.join(ciphertext)
+    return plaintext.translate(_translate_table(tuple(key.items())))
 
 def sub_decrypt(ciphertext: str, key: dict) -> str:
     """
@@ -32,22 +50,57 @@ def sub_decrypt(ciphertext: str, key: dict) -> str:
     -------
     the plaintext
     """
-    reverse_key = {v: k for k, v in key.items()}
-    return sub_encrypt(ciphertext, reverse_key)
+    return ciphertext.translate(_translate_table(tuple((v, k) for k, v in key.items())))
+
+def sub_key_array(key: dict) -> np.ndarray:
+    """
+    the key as a 26 entry array of digits, either case of letter is taken
+
+    Arguments
+    ---------
+    key: the substitution key, letter -> letter
+
+    Returns
+    -------
+    the uint8 array, entry i is where letter i goes
+    """
+    array = np.arange(26, dtype=np.uint8)
+    for k, v in key.items():
+        array[ord(k.lower()) - ord('a')] = ord(v.lower()) - ord('a')
+    return array
+
+def sub_apply_keys(message: list[int]|np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    applies many keys to one digital message at once as a single gather, for scoring candidate keys in bulk
+
+    Arguments
+    ---------
+    message: the digital message
+    keys: the keys as a (k x 26) uint8 array, row i sends digit d to keys[i, d], see sub_key_array
+
+    Returns
+    -------
+    the (k x n) uint8 array of the message under each key
+    """
+    keys = np.atleast_2d(np.asarray(keys, dtype=np.uint8))
+    return np.take(keys, to_digits(message), axis=1)
 
-def sub_decrypt_frequency(ciphertext: str) -> tuple[str, dict]|None:
+def sub_decrypt_frequency(ciphertext: str, dictionary: tuple[frozenset[str], int]|None = None) -> tuple[str, dict]|None:
     """
     performs decryption using character frequency, (e is most common), and digrams and such with user interaction
 
     Arguments
     ---------
     ciphertext: the message to decrypt
+    dictionary: the words and max word length from utils.get_dictionary, read from ./dictionary.txt if not given
 
     Returns
     -------
     the plaintext with the key or None if no solution is found
     """
-    dictionary, max_word_len = get_dictionary('./dictionary.txt')
+    if dictionary is None:
+        dictionary = get_dictionary('./dictionary.txt')
+    words, _ = dictionary
 
     # freq of 0.12
     letter_freq_1 = 'e'
@@ -85,7 +138,7 @@ def sub_decrypt_frequency(ciphertext: str) -> tuple[str, dict]|None:
         for j in range(len(cipher_freq)):
             key[cipher_freq[j]] = letter_freq[j]
     plaintext = ''.join([key[c] for c in ciphertext])
-    if is_valid(plaintext, dictionary, max_word_len):
+    if is_valid(plaintext, words):
         return plaintext, key
     else:
         plaintext = ''.join(['-']*len(ciphertext))
@@ -145,5 +198,218 @@ def sub_decrypt_frequency(ciphertext: str) -> tuple[str, dict]|None:
             key[command[0]] = command[1]
             plaintext = ''.join([key[c] if key[c].islower() else '-' for c in ciphertext])
             if '-' not in plaintext:
-                if is_valid(plaintext, dictionary, max_word_len):
+                if is_valid(plaintext, words):
                     return plaintext, key
+
+def _cipher_digits(ciphertext: str) -> np.ndarray:
+    """
+    the letters of a ciphertext as digits, anything that is not a letter dropped
+
+    Arguments
+    ---------
+    ciphertext: the message
+
+    Returns
+    -------
+    the uint8 array
+    """
+    digits = np.frombuffer(ciphertext.upper().encode('ascii', 'ignore'), dtype=np.uint8) - np.uint8(ord('A'))
+    return digits[digits < 26]
+
+def _frequency_key(digits: np.ndarray) -> np.ndarray:
+    """
+    the starting key that sends the most common cipher letter to the most common english letter and so on
+
+    Arguments
+    ---------
+    digits: the cipher letters as digits
+
+    Returns
+    -------
+    the key as a uint8 array, cipher digit -> plain digit
+    """
+    cipher_order = np.argsort(-np.bincount(digits, minlength=26), kind='stable')
+    plain_order = np.argsort(-np.array(get_normal_letter_probabilities()), kind='stable')
+    key = np.empty(26, dtype=np.uint8)
+    key[cipher_order] = plain_order
+    return key
+
+def _anneal(digits: np.ndarray, key: np.ndarray, steps: int, temperatures: tuple[float, float], rng: np.random.Generator, table: np.ndarray, priors: np.ndarray, swaps: dict) -> tuple[np.ndarray, float]:
+    """
+    anneals a substitution key by swapping the plain letters of two cipher letters. A swap only changes the n-grams over the positions of those two letters, so only they are rescored
+
+    Arguments
+    ---------
+    digits: the cipher letters as digits
+    key: the starting key, cipher digit -> plain digit
+    steps: the number of swaps tried
+    temperatures: the temperature at the first and last step, falling geometrically
+    rng: the random generator, advanced in place so later calls carry on from it
+    table: the n-gram table
+    priors: the log probability of each plain letter, added per letter to the n-gram score
+    swaps: cache of (a, b) -> (the n-gram starts touching cipher letter a or b, their windows of cipher letters), filled as swaps come up
+
+    Returns
+    -------
+    the best key found and its score
+    """
+    n = round(np.log(len(table))/np.log(26))
+    places = 26**np.arange(n - 1, -1, -1)
+    windows = np.lib.stride_tricks.sliding_window_view(digits, n)
+    key = key.copy()
+    score = float(table[key[windows] @ places].sum() + priors[key[digits]].sum())
+    counts = np.bincount(digits, minlength=26)
+    best_key, best_score = key.copy(), score
+
+    pairs = rng.integers(0, 26, size=(steps, 2))
+    chances = np.log(rng.random(steps))
+    t_start, t_end = temperatures
+    temperature = t_start*(t_end/t_start)**(np.arange(steps)/max(steps - 1, 1))
+    for (a, b), chance, t in zip(pairs.tolist(), chances.tolist(), temperature.tolist()):
+        if a == b:
+            continue
+        if a > b:
+            a, b = b, a
+        pair = swaps.get((a, b))
+        if pair is None:
+            starts = np.flatnonzero(np.convolve((digits == a) | (digits == b), np.ones(n, dtype=bool))[n - 1:len(windows) + n - 1])
+            pair = swaps[(a, b)] = (starts, windows[starts])
+        starts, touched = pair
+        new_key = key.copy()
+        new_key[a], new_key[b] = key[b], key[a]
+        delta = float(table[new_key[touched] @ places].sum() - table[key[touched] @ places].sum())
+        delta += float((counts[a] - counts[b])*(priors[key[b]] - priors[key[a]]))
+        if delta >= 0 or chance < delta/t:
+            key, score = new_key, score + delta
+            if score > best_score:
+                best_key, best_score = key.copy(), score
+    return best_key, best_score
+
+def _key_plaintext(ciphertext: str, key: np.ndarray) -> tuple[str, dict]:
+    """
+    decrypts with a key array and turns the key into a dictionary
+
+    Arguments
+    ---------
+    ciphertext: the message
+    key: cipher digit -> plain digit
+
+    Returns
+    -------
+    the plaintext with the key, cipher -> plain
+    """
+    key = {chr(ord('A') + c): chr(ord('a') + int(p)) for c, p in enumerate(key)}
+    return ciphertext.translate(_translate_table(tuple(key.items()))), key
+
+def sub_decrypt_anneal(ciphertext: str, steps: int = 20_000, seed: int|np.random.Generator|None = 0, start: dict|None = None, temperatures: tuple[float, float] = (20.0, 1.5), sample_len: int = 2000, table: np.ndarray|None = None, prior_weight: float = 1.0) -> tuple[str, dict]:
+    """
+    performs decryption without user interaction by simulated annealing over the key with n-gram fitness. A single run can get stuck on a wrong key, as seed 0 does on exercise 1.21a, so use sub_decrypt_restarts when the answer matters
+
+    Arguments
+    ---------
+    ciphertext: the message to decrypt
+    steps: the number of key swaps tried
+    seed: the seed or random generator, a generator is advanced in place so a run can be carried on by calling again with the key and the generator
+    start: the key to start from, cipher -> plain as returned. From letter frequencies if not given
+    temperatures: the temperature at the first and last step
+    sample_len: the number of letters the key is scored on, the cost of a swap grows with it
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+    prior_weight: the weight of the english letter frequencies added to the score per letter. The dictionary quadgrams count every word once no matter how common it is, so on their own they under rate common letters
+
+    Returns
+    -------
+    the plaintext with the key, cipher -> plain as in sub_decrypt_frequency
+    """
+    if table is None:
+        table = get_ngram_table()
+    rng = np.random.default_rng(seed)
+    digits = _cipher_digits(ciphertext)[:sample_len]
+    if start is None:
+        key = _frequency_key(digits)
+    else:
+        key = np.array([ord(start[chr(ord('A') + c)].lower()) - ord('a') for c in range(26)], dtype=np.uint8)
+    priors = prior_weight*np.log10(np.array(get_normal_letter_probabilities()))
+    key, _ = _anneal(digits, key, steps, temperatures, rng, table, priors, {})
+    return _key_plaintext(ciphertext, key)
+
+def _anneal_round(restart: tuple[np.ndarray, np.random.Generator, int, tuple[float, float]], search: tuple[np.ndarray, np.ndarray, np.ndarray]) -> tuple[np.ndarray, np.random.Generator, float]:
+    """
+    carries one restart on for a round
+
+    Arguments
+    ---------
+    restart: its key, its random generator, the number of steps and the temperatures of the round
+    search: the cipher digits, the n-gram table and the letter priors
+
+    Returns
+    -------
+    the restart's best key, its advanced generator and the key's score
+    """
+    key, rng, steps, temperatures = restart
+    digits, table, priors = search
+    key, score = _anneal(digits, key, steps, temperatures, rng, table, priors, {})
+    return key, rng, score
+
+def sub_decrypt_restarts(ciphertext: str, restarts: int = 8, seed: int = 0, rounds: int = 4, steps: int = 20_000, temperatures: tuple[float, float] = (20.0, 1.5), margin: float = 0.5, sample_len: int = 2000, table: np.ndarray|None = None, prior_weight: float = 1.0, workers: int = 1) -> tuple[str, dict, dict]:
+    """
+    runs seeded annealing restarts side by side in rounds. After each round the restarts scoring more than margin per letter below the best are dropped, and at the end the surviving keys vote on each letter. Each restart has its own random generator spawned from the seed and the dropping only looks at the scores, so the result for a seed is the same for any number of workers
+
+    Arguments
+    ---------
+    ciphertext: the message to decrypt
+    restarts: the number of annealing runs
+    seed: the seed every restart's generator is spawned from
+    rounds: the number of rounds the steps and the temperature schedule are split into
+    steps: the number of key swaps each restart tries over all rounds
+    temperatures: the temperature at the first and last step
+    margin: how far below the best score per letter a restart may fall and still go on
+    sample_len: the number of letters the keys are scored on
+    table: the n-gram table to score with, see fitness.get_ngram_table. The quadgram table of ./dictionary.txt if not given
+    prior_weight: the weight of the english letter frequencies, see sub_decrypt_anneal
+    workers: the number of processes to run the restarts on, see parallel.parallel_map
+
+    Returns
+    -------
+    the plaintext, the consensus key (cipher -> plain) and for each cipher letter the share of surviving restarts that agree with it
+    """
+    if table is None:
+        table = get_ngram_table()
+    digits = _cipher_digits(ciphertext)[:sample_len]
+    priors = prior_weight*np.log10(np.array(get_normal_letter_probabilities()))
+    search = (digits, table, priors)
+
+    start = _frequency_key(digits)
+    live = [(start, np.random.default_rng(child), float('-inf')) for child in np.random.SeedSequence(seed).spawn(restarts)]
+    t_start, t_end = temperatures
+    bounds = [t_start*(t_end/t_start)**(r/rounds) for r in range(rounds + 1)]
+    for r in range(rounds):
+        round_steps = steps//rounds + (r < steps%rounds)
+        work = [(key, rng, round_steps, (bounds[r], bounds[r + 1])) for key, rng, _ in live]
+        if workers > 1:
+            live = parallel_map(_anneal_round, work, search, workers)
+        else:
+            live = [_anneal_round(restart, search) for restart in work]
+        best = max(score for _, _, score in live)
+        live = [restart for restart in live if restart[2] >= best - margin*len(digits)]
+
+    # the surviving keys vote with their boltzmann weight at the last temperature, then letters are assigned greedily from the strongest vote
+    keys = np.array([key for key, _, _ in live])
+    scores = np.array([score for _, _, score in live])
+    votes = np.zeros((26, 26))
+    np.add.at(votes, (np.tile(np.arange(26), len(keys)), keys.ravel()), np.repeat(10**((scores - scores.max())/t_end), 26))
+    key = np.empty(26, dtype=np.uint8)
+    free_cipher, free_plain = np.ones(26, dtype=bool), np.ones(26, dtype=bool)
+    for flat in np.argsort(-votes, axis=None, kind='stable'):
+        c, p = divmod(int(flat), 26)
+        if free_cipher[c] and free_plain[p]:
+            key[c] = p
+            free_cipher[c] = free_plain[p] = False
+    confidence = {chr(ord('A') + c): float((keys[:, c] == key[c]).mean()) for c in range(26)}
+    plaintext, key = _key_plaintext(ciphertext, key)
+    return plaintext, key, confidence
+
+if __name__ == '__main__':
+    ciphertext = read('./exercises/Chapter_01/1_21a.txt', 'cipher')
+    plaintext, key, confidence = sub_decrypt_restarts(ciphertext)
+    assert plaintext.startswith('imaynotbeabletogrowflowersbutmygardenproducesjustasmanydeadleaves')
+    print(plaintext)
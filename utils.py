@@ -1,10 +1,20 @@
 from numpy import unique
 from math import comb
+from collections import deque
+from functools import lru_cache
+import os
+import pickle
 
 
-def get_dictionary(file: str) -> tuple[list[str], int]:
+# bump when the snapshot layout changes so stale snapshots are rebuilt
+DICTIONARY_SNAPSHOT_VERSION = 1
+
+# absolute path -> (mtime, (words, max word length))
+_dictionary_cache: dict[str, tuple[int, tuple[frozenset[str], int]]] = {}
+
+def read_dictionary(file: str) -> tuple[frozenset[str], int]:
     """
-    reads a dictionary and splits it into a list
+    reads a dictionary into a hashed set so word lookups are O(1). Uncached, see get_dictionary
 
     Arguments
     ---------
@@ -21,7 +31,116 @@ def get_dictionary(file: str) -> tuple[list[str], int]:
     # remove single-letter words except 'a' and 'i'
     dictionary = [w for w in dictionary if not (len(w) == 1 and w not in ('a', 'i'))]
     max_word_len = max((len(w) for w in dictionary)) if dictionary else 0
-    return dictionary, max_word_len
+    return frozenset(dictionary), max_word_len
+
+def save_dictionary_snapshot(dictionary: tuple[frozenset[str], int], snapshot: str, mtime: int) -> None:
+    """
+    pickles a loaded dictionary behind a version header so it can be reloaded without reparsing the text file
+
+    Arguments
+    ---------
+    dictionary: the words and max word length
+    snapshot: the directory of the snapshot to write
+    mtime: the modification time (ns) of the text file the dictionary was read from
+    """
+    with open(snapshot, 'wb') as f:
+        pickle.dump((DICTIONARY_SNAPSHOT_VERSION, mtime, dictionary), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_dictionary_snapshot(snapshot: str, mtime: int) -> tuple[frozenset[str], int]|None:
+    """
+    loads a snapshot written by save_dictionary_snapshot
+
+    Arguments
+    ---------
+    snapshot: the directory of the snapshot
+    mtime: the modification time (ns) of the text file the snapshot must have been built from
+
+    Returns
+    -------
+    the words and max word length or None if the snapshot is missing, stale or of another version
+    """
+    try:
+        with open(snapshot, 'rb') as f:
+            version, snapshot_mtime, dictionary = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, TypeError):
+        return None
+    if version != DICTIONARY_SNAPSHOT_VERSION or snapshot_mtime != mtime:
+        return None
+    return dictionary
+
+def get_dictionary(file: str, snapshot: str|None = None) -> tuple[frozenset[str], int]:
+    """
+    reads a dictionary into a hashed set so word lookups are O(1). The result is cached for the process and only reread when the file changes
+
+    Arguments
+    ---------
+    file: the directory of the dictionary
+    snapshot: optional directory of a precompiled snapshot. It is loaded instead of parsing file when up to date, and (re)written otherwise
+
+    Returns
+    -------
+    the dictionary and the max word length
+    """
+    path = os.path.abspath(file)
+    mtime = os.stat(path).st_mtime_ns
+    cached = _dictionary_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    dictionary = load_dictionary_snapshot(snapshot, mtime) if snapshot is not None else None
+    if dictionary is None:
+        dictionary = read_dictionary(path)
+        if snapshot is not None:
+            save_dictionary_snapshot(dictionary, snapshot, mtime)
+    _dictionary_cache[path] = (mtime, dictionary)
+    return dictionary
+
+@lru_cache(maxsize=4)
+def get_word_automaton(dictionary: frozenset[str]) -> tuple[list[dict[str, int]], list[int], list[tuple[int, ...]]]:
+    """
+    builds an Aho-Corasick automaton over the dictionary so every word occurring in a text can be found in one pass. Cached per dictionary
+
+    Arguments
+    ---------
+    dictionary: the words, as returned by get_dictionary
+
+    Returns
+    -------
+    the goto transitions of each state, the failure link of each state, and the lengths of the words that end in each state
+    """
+    goto: list[dict[str, int]] = [{}]
+    lengths: list[list[int]] = [[]]
+    for word in dictionary:
+        # words with apostrophes and such can never match a digitized message
+        if not (word.isascii() and word.isalpha()):
+            continue
+        state = 0
+        for ch in word:
+            nxt = goto[state].get(ch)
+            if nxt is None:
+                nxt = len(goto)
+                goto[state][ch] = nxt
+                goto.append({})
+                lengths.append([])
+            state = nxt
+        lengths[state].append(len(word))
+
+    # breadth first so a state's failure link is finished before its children need it
+    fail = [0]*len(goto)
+    out: list[tuple[int, ...]] = [()]*len(goto)
+    queue = deque(goto[0].values())
+    for state in queue:
+        out[state] = tuple(lengths[state])
+    while queue:
+        state = queue.popleft()
+        for ch, nxt in goto[state].items():
+            f = fail[state]
+            while ch not in goto[f] and f != 0:
+                f = fail[f]
+            fail[nxt] = goto[f].get(ch, 0)
+            out[nxt] = tuple(lengths[nxt]) + out[fail[nxt]] if lengths[nxt] else out[fail[nxt]]
+            queue.append(nxt)
+    return goto, fail, out
 
 def get_common_letters() -> str:
     """
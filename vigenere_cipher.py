@@ -1,9 +1,12 @@
+from itertools import chain
 from math import gcd
-from utils import get_letter_freqs, get_normal_letter_probabilities, index_of_coincidence
+from utils import get_normal_letter_probabilities, index_of_coincidence
 from numpy import mean
+import numpy as np
+from ciphertext import MOD_26, apply_table, match_input, to_array, to_digits
 
 
-def vigenere_encrypt(plaintext: list[int], key: list[int]) -> list[int]:
+def vigenere_encrypt(plaintext: list[int]|np.ndarray, key: list[int]) -> list[int]|np.ndarray:
     """
     performs a vigenere encryption by c = p + key
 
@@ -14,16 +17,13 @@ def vigenere_encrypt(plaintext: list[int], key: list[int]) -> list[int]:
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
-    ciphertext = plaintext.copy()
+    p = to_digits(plaintext)
+    keystream = np.tile(to_digits(key), -(-len(p)//len(key)))[:len(p)]
+    return match_input(apply_table(p + keystream, MOD_26), plaintext)
 
-    for i in range(len(ciphertext)):
-        ciphertext[i] = (ciphertext[i] + key[i%len(key)])%26
-
-    return ciphertext
-
-def vigenere_decrypt(ciphertext: list[int], key: list[int]) -> list[int]:
+def vigenere_decrypt(ciphertext: list[int]|np.ndarray, key: list[int]) -> list[int]|np.ndarray:
     """
     performs a vigenere decryption by c = p - key
 
@@ -34,14 +34,12 @@ def vigenere_decrypt(ciphertext: list[int], key: list[int]) -> list[int]:
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
-    plaintext = ciphertext.copy()
-
-    for i in range(len(plaintext)):
-        plaintext[i] = (plaintext[i] - key[i%len(key)])%26
-
-    return plaintext
+    c = to_digits(ciphertext)
+    # subtracting k is adding 26 - k, which keeps the sum in uint8
+    keystream = np.tile(((26 - to_digits(key))%26).astype(np.uint8), -(-len(c)//len(key)))[:len(c)]
+    return match_input(apply_table(c + keystream, MOD_26), ciphertext)
 
 def kasiski_test(ciphertext: list[int], length: int = 3) -> tuple[int, int]:
     """
@@ -71,6 +69,111 @@ def kasiski_test(ciphertext: list[int], length: int = 3) -> tuple[int, int]:
     # get the gcd
     return gcd(*diffs[1:]), len(indices)
 
+def suffix_array(text: list[int]|np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    sorts the suffixes of the text by prefix doubling and builds the lcp array with kasai's algorithm
+
+    Arguments
+    ---------
+    text: the digital text
+
+    Returns
+    -------
+    the suffix array (start of the i-th smallest suffix) and the lcp array (common prefix length of suffixes i - 1 and i, 0 for i = 0)
+    """
+    t = np.asarray(text, dtype=np.int64)
+    n = len(t)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    rank = t.copy()
+    k = 1
+    while True:
+        # sort by (rank of the first k letters, rank of the next k letters)
+        second = np.full(n, -1, dtype=np.int64)
+        second[:max(n - k, 0)] = rank[k:]
+        sa = np.lexsort((second, rank))
+        first_sorted, second_sorted = rank[sa], second[sa]
+        new_group = np.ones(n, dtype=np.int64)
+        new_group[1:] = (first_sorted[1:] != first_sorted[:-1]) | (second_sorted[1:] != second_sorted[:-1])
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = np.cumsum(new_group) - 1
+        if rank[sa[-1]] == n - 1 or k >= n:
+            break
+        k *= 2
+
+    # kasai: the lcp of a suffix's neighbour drops by at most one from the previous suffix's
+    tl, sal, rankl = t.tolist(), sa.tolist(), rank.tolist()
+    lcp = [0]*n
+    h = 0
+    for i in range(n):
+        r = rankl[i]
+        if r == 0:
+            h = 0
+            continue
+        j = sal[r - 1]
+        while i + h < n and j + h < n and tl[i + h] == tl[j + h]:
+            h += 1
+        lcp[r] = h
+        if h > 0:
+            h -= 1
+    return sa, np.array(lcp, dtype=np.int64)
+
+def find_repeats(ciphertext: list[int]|np.ndarray, min_length: int = 3, index: tuple[np.ndarray, np.ndarray]|None = None) -> list[tuple[list[int], list[int]]]:
+    """
+    finds every repeated substring of at least min_length from the lcp intervals of the suffix array. Each interval is reported once with its longest string, the shorter strings down to its parent interval's length repeat at exactly the same positions
+
+    Arguments
+    ---------
+    ciphertext: the text
+    min_length: the shortest repeat to report
+    index: the suffix and lcp arrays of the ciphertext if already built, see suffix_array
+
+    Returns
+    -------
+    the repeated substrings with their sorted start positions
+    """
+    sa, lcp = suffix_array(ciphertext) if index is None else index
+    text = np.asarray(ciphertext)
+    n = len(sa)
+    repeats = []
+    # stack of (lcp, left bound) of the open intervals
+    stack = [(0, 0)]
+    lcpl = lcp.tolist()
+    for i in range(1, n + 1):
+        current = lcpl[i] if i < n else 0
+        left = i - 1
+        while stack[-1][0] > current:
+            length, left = stack.pop()
+            if length >= min_length:
+                positions = sorted(sa[left:i].tolist())
+                start = positions[0]
+                repeats.append((text[start:start + length].tolist(), positions))
+        if stack[-1][0] < current:
+            stack.append((current, left))
+    return repeats
+
+def kasiski_factor_histogram(repeats: list[tuple[list[int], list[int]]], limit: int) -> dict[int, int]:
+    """
+    counts how many distances between successive occurrences of each repeat every candidate key length divides
+
+    Arguments
+    ---------
+    repeats: the repeats, see find_repeats
+    limit: the highest factor to count
+
+    Returns
+    -------
+    factor -> number of distances it divides, for factors 2 to limit
+    """
+    if not repeats:
+        return {f: 0 for f in range(2, limit + 1)}
+    positions = np.fromiter(chain.from_iterable(p for _, p in repeats), dtype=np.int64)
+    sizes = np.fromiter((len(p) for _, p in repeats), dtype=np.int64, count=len(repeats))
+    # differences across the boundary of two repeats are not distances
+    distances = np.delete(np.diff(positions), np.cumsum(sizes)[:-1] - 1)
+    return {f: int((distances%f == 0).sum()) for f in range(2, limit + 1)}
+
 def divide_string_by_index(text: list[int], num_subsets: int) -> list[list[int]]:
     """
     puts the text into boxes according to their index. If num_subsets is 3, then text[i] -> box[i%num_subsets]
@@ -108,7 +211,7 @@ def index_of_coincidence_test(ciphertext: list[int], length: int = 3) -> float:
 
 def get_key_length_kasiski(ciphertext: list[int], limit: int) -> int:
     """
-    attempts to determine the length of the keyword with the kasiski test. Will decide a key length by the non-zero kasiski_test value with the most substring occurances.
+    attempts to determine the length of the keyword with the kasiski test. Will decide a key length by the non-zero kasiski_test value with the most substring occurances. The suffix array is built once and the most frequent substring of every length is read off its lcp array
 
     Arguments
     ---------
@@ -120,38 +223,98 @@ def get_key_length_kasiski(ciphertext: list[int], limit: int) -> int:
     the length of the key
     """
     best_length, best_num_subs = 1, 1
+    if len(ciphertext) < 2:
+        return best_length
+    sa, lcp = suffix_array(ciphertext)
 
     for i in range(3, limit + 1):
-        m, n_subs = kasiski_test(ciphertext, i)
+        # runs of adjacent suffixes sharing their first i letters are the occurrences of one substring
+        shared = np.concatenate(([0], (lcp[1:] >= i).astype(np.int8), [0]))
+        edges = np.diff(shared)
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        if len(starts) == 0:
+            continue
+        n_subs = int((ends - starts).max()) + 1
         if n_subs > best_num_subs:
-            best_length = m
+            # like max() over the substrings in text order, ties go to the earliest occurrence
+            runs = [sa[a:b + 1] for a, b in zip(starts, ends) if b - a + 1 == n_subs]
+            indices = np.sort(min(runs, key=lambda r: r.min()))
+            best_length = gcd(*(indices[1:] - indices[0]).tolist())
             best_num_subs = n_subs
     return best_length
 
-def get_key_length_index_coincidence(ciphertext: list[int], limit: int) -> int:
+def index_of_coincidence_profile(ciphertext: list[int]|np.ndarray, limit: int) -> np.ndarray:
+    """
+    computes the mean index of coincidence of the columns for every period from 1 to limit. Each period is one bincount of column*26 + letter over the whole text, instead of building the boxes in python. Like utils.index_of_coincidence the matches leave out the letter a, so entry i equals index_of_coincidence_test(ciphertext, i + 1)
+
+    Arguments
+    ---------
+    ciphertext: the message
+    limit: the highest period
+
+    Returns
+    -------
+    the profile, entry i is the mean index of coincidence for period i + 1
+    """
+    c = to_digits(ciphertext).astype(np.int64)
+    positions = np.arange(len(c))
+    profile = np.zeros(limit)
+    for period in range(1, limit + 1):
+        counts = np.bincount((positions%period)*26 + c, minlength=period*26).reshape(period, 26)
+        sizes = counts.sum(axis=1)
+        pairs = sizes*(sizes - 1)
+        matches = (counts[:, 1:]*(counts[:, 1:] - 1)).sum(axis=1)
+        ics = np.divide(matches, pairs, out=np.zeros(period), where=pairs > 0)
+        profile[period - 1] = ics.mean()
+    return profile
+
+def get_key_length_index_coincidence(ciphertext: list[int], limit: int, tolerance: float = 0.0) -> int:
     """
-    attempts to determine the length of the keyword with the index of coincidence. Will decide a key length by the index_of_coincidence closest to 0.065 up to the limit
+    attempts to determine the length of the keyword with the index of coincidence. Will decide a key length by the index_of_coincidence closest to 0.065 up to the limit. Multiples of the key length score as well as the key length itself, so with a large limit a positive tolerance lets the shortest length within it of the best win instead
 
     Arguments
     ---------
     ciphertext: the message
     limit: the highest number to test
+    tolerance: how much further from 0.065 than the best a shorter length may be. On a few hundred letters the gap between a length and its multiples is often under 0.005, so a tolerance can pick a divisor of the key length
 
     Returns
     -------
     the length of the key
     """
-    best_length, best_distance = 0, 2
+    if limit < 3:
+        return 0
+    profile = index_of_coincidence_profile(ciphertext, limit)
+    distances = np.abs(profile[2:] - 0.065)
+    candidates = np.flatnonzero(distances <= distances.min() + tolerance)
+    return int(candidates[0]) + 3
+
+def vigenere_key_correlation(ciphertext: list[int]|np.ndarray, m: int, top_k: int = 1) -> tuple[list[int], list[list[int]]]:
+    """
+    finds the keyword shift of every column at once. The (m x 26) letter counts of the columns are multiplied by the circulant matrix of the normal letter probabilities, which gives the M_g statistic for every column and shift g in one product
 
-    for i in range(3, limit + 1):
-        ic = index_of_coincidence_test(ciphertext, i)
-        distance = abs(ic - 0.065)
-        if distance < best_distance:
-            best_distance = distance
-            best_length = i
-    return best_length
+    Arguments
+    ---------
+    ciphertext: the message
+    m: the length of the keyword
+    top_k: the number of shifts to keep per column
 
-def vigenere_decrypt_kasiski_index(ciphertext: list[int], method: str) -> tuple[list[int], list[int]]:
+    Returns
+    -------
+    the best keyword, and the top_k shifts of each column from best to worst
+    """
+    c = to_digits(ciphertext).astype(np.int64)
+    counts = np.bincount((np.arange(len(c))%m)*26 + c, minlength=m*26).reshape(m, 26)
+    sizes = counts.sum(axis=1, keepdims=True)
+    p = np.array(get_normal_letter_probabilities())
+    # circulant[j, g] = p[(j - g)%26], so (counts@circulant)[i, g] = sum_k p[k]*counts[i, (k + g)%26]
+    letters = np.arange(26)
+    circulant = p[(letters[:, None] - letters[None, :])%26]
+    mg = np.divide(counts@circulant, sizes, out=np.zeros((m, 26)), where=sizes > 0)
+    ranked = np.argsort(-mg, axis=1, kind='stable')[:, :top_k]
+    return ranked[:, 0].tolist(), ranked.tolist()
+
+def vigenere_decrypt_kasiski_index(ciphertext: list[int], method: str, limit: int = 10) -> tuple[list[int], list[int]]:
     """
     attempts to decrypt using the kasiski test and/or index of coincidence to get the length of the keyword, then using the index of coincidence to find the keyword
 
@@ -159,6 +322,7 @@ def vigenere_decrypt_kasiski_index(ciphertext: list[int], method: str) -> tuple[
     ---------
     ciphertext: the message
     method: one of 'kasiski', 'index', or 'both'
+    limit: the longest keyword to consider
 
     Returns
     -------
@@ -166,12 +330,12 @@ def vigenere_decrypt_kasiski_index(ciphertext: list[int], method: str) -> tuple[
     """
     match method:
         case 'kasiski':
-            m = get_key_length_kasiski(ciphertext, 10)
+            m = get_key_length_kasiski(ciphertext, limit)
         case 'index':
-            m = get_key_length_index_coincidence(ciphertext, 10)
+            m = get_key_length_index_coincidence(ciphertext, limit)
         case 'both':
-            m_kasiski = get_key_length_kasiski(ciphertext, 10)
-            m_index = get_key_length_index_coincidence(ciphertext, 10)
+            m_kasiski = get_key_length_kasiski(ciphertext, limit)
+            m_index = get_key_length_index_coincidence(ciphertext, limit)
             if m_kasiski != m_index:
                 raise ValueError(f'm_kasiski: {m_kasiski}, m_index: {m_index} don\'t agree')
             m = m_kasiski
@@ -179,23 +343,11 @@ def vigenere_decrypt_kasiski_index(ciphertext: list[int], method: str) -> tuple[
         case _:
             raise ValueError(f'method {method} is not valid. Should be kasiski, index, or both')
 
-    key = []
-    p = get_normal_letter_probabilities()
-    substrings = divide_string_by_index(ciphertext, m)
-    for i in range(m):
-        key_best = 0
-        mg_best = 0
-        freqs = get_letter_freqs(substrings[i])
-        for j in range(1, 27):
-            mg = sum([p[k]*freqs[(k+j)%26] for k in range(26)])/len(substrings[i])
-            if mg > mg_best:
-                mg_best = mg
-                key_best = j
-        key.append(key_best)
+    key, _ = vigenere_key_correlation(ciphertext, m)
     plaintext = vigenere_decrypt(ciphertext, key)
     return plaintext, key
 
-def vigenere_shift_encrypt(plaintext: list[int], key: list[int]) -> list[int]:
+def vigenere_shift_encrypt(plaintext: list[int]|np.ndarray, key: list[int]) -> list[int]|np.ndarray:
     """
     performs a vigenere encryption but the key shifts up by one each iteration
 
@@ -206,17 +358,15 @@ def vigenere_shift_encrypt(plaintext: list[int], key: list[int]) -> list[int]:
 
     Returns
     -------
-    the ciphertext
+    the ciphertext, in the same form as the plaintext
     """
-    ciphertext = plaintext.copy()
+    p = to_array(plaintext)
     m = len(key)
+    i = np.arange(len(p))
+    keystream = (to_array(key)[i%m] + i//m)%26
+    return match_input((p + keystream)%26, plaintext)
 
-    for i in range(len(ciphertext)):
-        ciphertext[i] = (ciphertext[i] + key[i%m] + i//m)%26
-
-    return ciphertext
-
-def vigenere_shift_decrypt(ciphertext: list[int], key: list[int]) -> list[int]:
+def vigenere_shift_decrypt(ciphertext: list[int]|np.ndarray, key: list[int]) -> list[int]|np.ndarray:
     """
     performs a vigenere decryption but the key shifts up by one each iteration
 
@@ -227,15 +377,13 @@ def vigenere_shift_decrypt(ciphertext: list[int], key: list[int]) -> list[int]:
 
     Returns
     -------
-    the plaintext
+    the plaintext, in the same form as the ciphertext
     """
-    plaintext = ciphertext.copy()
+    c = to_array(ciphertext)
     m = len(key)
-
-    for i in range(len(plaintext)):
-        plaintext[i] = (plaintext[i] - key[i%m] - i//m)%26
-
-    return plaintext
+    i = np.arange(len(c))
+    keystream = (to_array(key)[i%m] + i//m)%26
+    return match_input((c - keystream)%26, ciphertext)
 
 def vigenere_shift_decrypt_index(ciphertext: list[int]) -> tuple[list[int], list[int]]:
     """
@@ -259,18 +407,6 @@ def vigenere_shift_decrypt_index(ciphertext: list[int]) -> tuple[list[int], list
             best_m = m
     ciphertext_unshifted = vigenere_shift_decrypt(ciphertext, [0]*best_m)
 
-    key = []
-    p = get_normal_letter_probabilities()
-    substrings = divide_string_by_index(ciphertext_unshifted, best_m)
-    for i in range(best_m):
-        key_best = 0
-        mg_best = 0
-        freqs = get_letter_freqs(substrings[i])
-        for j in range(1, 27):
-            mg = sum([p[k]*freqs[(k+j)%26] for k in range(26)])/len(substrings[i])
-            if mg > mg_best:
-                mg_best = mg
-                key_best = j
-        key.append(key_best)
+    key, _ = vigenere_key_correlation(ciphertext_unshifted, best_m)
     plaintext = vigenere_decrypt(ciphertext_unshifted, key)
     return plaintext, key